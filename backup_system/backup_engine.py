@@ -1,338 +1,726 @@
-"""
-Jezgra sustava za backup
-Implementira sve tri strategije: Full, Incremental, Differential
-"""
-
-import os
-import shutil
-import json
-from datetime import datetime, timedelta
-from typing import Dict, Tuple
-import time
-
-from shutil import rmtree
-
-
-class BackupEngine:
-    def __init__(self, backup_root: str, logger=None, integrity_checker=None):
-        self.backup_root = backup_root
-        self.logger = logger
-        self.integrity_checker = integrity_checker
-        self.metadata_dir = os.path.join(backup_root, '.metadata')
-        self.backup_history_file = os.path.join(self.metadata_dir, 'backup_history.json')
-        
-        os.makedirs(self.metadata_dir, exist_ok=True)
-        os.makedirs(os.path.join(backup_root, 'full'), exist_ok=True)
-        os.makedirs(os.path.join(backup_root, 'incremental'), exist_ok=True)
-        os.makedirs(os.path.join(backup_root, 'differential'), exist_ok=True)
-        
-        self.backup_history = self._load_history()
-    
-    def _load_history(self) -> Dict:
-        if os.path.exists(self.backup_history_file):
-            with open(self.backup_history_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                # osiguraj da svi timestampi budu datetime
-                for b in data.get('backups', []):
-                    if isinstance(b.get('timestamp'), str):
-                        try:
-                            b['timestamp'] = datetime.fromisoformat(b['timestamp'])
-                        except Exception:
-                            b['timestamp'] = datetime.now()
-                return data
-        return {'backups': []}
-    
-    def _save_history(self):
-        # osiguraj da folder postoji
-        os.makedirs(self.metadata_dir, exist_ok=True)
-
-        # prije spremanja, pretvori datetime u string
-        save_data = {'backups': []}
-        for b in self.backup_history.get('backups', []):
-            b_copy = b.copy()
-            if isinstance(b_copy.get('timestamp'), datetime):
-                b_copy['timestamp'] = b_copy['timestamp'].isoformat()
-            save_data['backups'].append(b_copy)
-
-        with open(self.backup_history_file, 'w', encoding='utf-8') as f:
-            json.dump(save_data, f, indent=2)
-    
-    def _get_file_list(self, directory: str) -> Dict[str, Dict]:
-        file_list = {}
-        try:
-            for root, dirs, files in os.walk(directory):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    relative_path = os.path.relpath(file_path, directory)
-                    file_list[relative_path] = {
-                        'modified': os.path.getmtime(file_path),
-                        'size': os.path.getsize(file_path)
-                    }
-        except Exception as e:
-            if self.logger:
-                self.logger.logger.error(f"Greska pri citanju datoteka: {e}")
-        return file_list
-    
-    # --- FULL BACKUP ---
-    def full_backup(self, source_dir: str, backup_id: str = None) -> Tuple[bool, Dict]:
-        if backup_id is None:
-            backup_id = f"full_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        
-        backup_dir = os.path.join(self.backup_root, 'full', backup_id)
-        metadata = {
-            'id': backup_id,
-            'type': 'full',
-            'timestamp': datetime.now(),
-            'source': source_dir,
-            'status': 'in_progress'
-        }
-        
-        try:
-            start_time = time.time()
-            if self.logger:
-                self.logger.log_backup_start('FULL', source_dir, backup_dir)
-            
-            if os.path.exists(backup_dir):
-                shutil.rmtree(backup_dir)
-            
-            shutil.copytree(source_dir, backup_dir)
-            
-            file_list = self._get_file_list(backup_dir)
-            duration = time.time() - start_time
-            
-            metadata.update({
-                'file_count': len(file_list),
-                'size_bytes': sum(info['size'] for info in file_list.values()),
-                'duration_seconds': duration,
-                'status': 'completed',
-                'files': file_list
-            })
-            
-            if self.integrity_checker:
-                manifest_path = os.path.join(backup_dir, 'MANIFEST.json')
-                self.integrity_checker.create_backup_manifest(backup_dir, manifest_path)
-            
-            self.backup_history['backups'].append(metadata)
-            self._save_history()
-            
-            if self.logger:
-                self.logger.log_backup_complete(backup_id, metadata['file_count'], 
-                                               metadata['size_bytes'], duration)
-            
-            return True, metadata
-        except Exception as e:
-            metadata['status'] = 'failed'
-            metadata['error'] = str(e)
-            self.backup_history['backups'].append(metadata)
-            self._save_history()
-            if self.logger:
-                self.logger.log_backup_error(backup_id, str(e))
-            return False, metadata
-    
-    # --- INCREMENTAL BACKUP ---
-    def incremental_backup(self, source_dir: str, backup_id: str = None) -> Tuple[bool, Dict]:
-        if backup_id is None:
-            backup_id = f"incremental_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        backup_dir = os.path.join(self.backup_root, 'incremental', backup_id)
-        metadata = {'id': backup_id, 'type': 'incremental', 'timestamp': datetime.now(),
-                    'source': source_dir, 'status': 'in_progress'}
-        
-        try:
-            start_time = time.time()
-            if self.logger:
-                self.logger.log_backup_start('INCREMENTAL', source_dir, backup_dir)
-            
-            last_backup_time = self._get_last_backup_time()
-            
-            if os.path.exists(backup_dir):
-                shutil.rmtree(backup_dir)
-            os.makedirs(backup_dir)
-            
-            file_list = {}
-            copied_count = 0
-            
-            for root, dirs, files in os.walk(source_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    relative_path = os.path.relpath(file_path, source_dir)
-                    if os.path.getmtime(file_path) > last_backup_time:
-                        target_path = os.path.join(backup_dir, relative_path)
-                        os.makedirs(os.path.dirname(target_path), exist_ok=True)
-                        shutil.copy2(file_path, target_path)
-                        copied_count += 1
-                        file_list[relative_path] = {
-                            'modified': os.path.getmtime(file_path),
-                            'size': os.path.getsize(file_path)
-                        }
-            
-            duration = time.time() - start_time
-            metadata.update({
-                'file_count': copied_count,
-                'size_bytes': sum(info['size'] for info in file_list.values()),
-                'duration_seconds': duration,
-                'status': 'completed',
-                'files': file_list
-            })
-            
-            if self.integrity_checker:
-                manifest_path = os.path.join(backup_dir, 'MANIFEST.json')
-                self.integrity_checker.create_backup_manifest(backup_dir, manifest_path)
-            
-            self.backup_history['backups'].append(metadata)
-            self._save_history()
-            if self.logger:
-                self.logger.log_backup_complete(backup_id, metadata['file_count'], 
-                                               metadata['size_bytes'], duration)
-            return True, metadata
-        except Exception as e:
-            metadata['status'] = 'failed'
-            metadata['error'] = str(e)
-            self.backup_history['backups'].append(metadata)
-            self._save_history()
-            if self.logger:
-                self.logger.log_backup_error(backup_id, str(e))
-            return False, metadata
-    
-    # --- DIFFERENTIAL BACKUP ---
-    def differential_backup(self, source_dir: str, backup_id: str = None) -> Tuple[bool, Dict]:
-        if backup_id is None:
-            backup_id = f"differential_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        backup_dir = os.path.join(self.backup_root, 'differential', backup_id)
-        metadata = {'id': backup_id, 'type': 'differential', 'timestamp': datetime.now(),
-                    'source': source_dir, 'status': 'in_progress'}
-        
-        try:
-            start_time = time.time()
-            if self.logger:
-                self.logger.log_backup_start('DIFFERENTIAL', source_dir, backup_dir)
-            
-            last_full_time = self._get_last_full_backup_time()
-            
-            if os.path.exists(backup_dir):
-                shutil.rmtree(backup_dir)
-            os.makedirs(backup_dir)
-            
-            file_list = {}
-            copied_count = 0
-            
-            for root, dirs, files in os.walk(source_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    relative_path = os.path.relpath(file_path, source_dir)
-                    if os.path.getmtime(file_path) > last_full_time:
-                        target_path = os.path.join(backup_dir, relative_path)
-                        os.makedirs(os.path.dirname(target_path), exist_ok=True)
-                        shutil.copy2(file_path, target_path)
-                        copied_count += 1
-                        file_list[relative_path] = {
-                            'modified': os.path.getmtime(file_path),
-                            'size': os.path.getsize(file_path)
-                        }
-            
-            duration = time.time() - start_time
-            metadata.update({
-                'file_count': copied_count,
-                'size_bytes': sum(info['size'] for info in file_list.values()),
-                'duration_seconds': duration,
-                'status': 'completed',
-                'files': file_list
-            })
-            
-            if self.integrity_checker:
-                manifest_path = os.path.join(backup_dir, 'MANIFEST.json')
-                self.integrity_checker.create_backup_manifest(backup_dir, manifest_path)
-            
-            self.backup_history['backups'].append(metadata)
-            self._save_history()
-            if self.logger:
-                self.logger.log_backup_complete(backup_id, metadata['file_count'], 
-                                               metadata['size_bytes'], duration)
-            return True, metadata
-        except Exception as e:
-            metadata['status'] = 'failed'
-            metadata['error'] = str(e)
-            self.backup_history['backups'].append(metadata)
-            self._save_history()
-            if self.logger:
-                self.logger.log_backup_error(backup_id, str(e))
-            return False, metadata
-    
-    # --- POMOĆNE FUNKCIJE ---
-    def _get_last_backup_time(self) -> float:
-        for backup in reversed(self.backup_history.get('backups', [])):
-            if backup.get('status') == 'completed':
-                ts = backup['timestamp']
-                if isinstance(ts, str):
-                    ts = datetime.fromisoformat(ts)
-                return ts.timestamp()
-        return (datetime.now() - timedelta(days=365)).timestamp()
-    
-    def _get_last_full_backup_time(self) -> float:
-        for backup in reversed(self.backup_history.get('backups', [])):
-            if backup.get('type') == 'full' and backup.get('status') == 'completed':
-                ts = backup['timestamp']
-                if isinstance(ts, str):
-                    ts = datetime.fromisoformat(ts)
-                return ts.timestamp()
-        return (datetime.now() - timedelta(days=365)).timestamp()
-    
-    def get_backup_summary(self) -> Dict:
-        """Vrati sažetak svih backup-a"""
-        summary = {
-            'total_backups': 0,
-            'total_size_bytes': 0,
-            'backups': []
-        }
-        
-        for backup in self.backup_history.get('backups', []):
-            ts = backup['timestamp']
-            if isinstance(ts, str):
-                ts = datetime.fromisoformat(ts)
-                backup['timestamp'] = ts
-            
-            summary['backups'].append({
-                'id': backup['id'],
-                'type': backup['type'],
-                'files': backup.get('file_count', 0),
-                'size_mb': backup.get('size_bytes', 0) / (1024*1024),
-                'status': backup.get('status', 'unknown'),
-                'timestamp': ts
-            })
-            summary['total_backups'] += 1
-            summary['total_size_bytes'] += backup.get('size_bytes', 0)
-        
-        # sortiranje po timestamp, newest first
-        summary['backups'].sort(key=lambda b: b['timestamp'], reverse=True)
-        return summary
-
-    # --- DELETE ALL BACKUPS ---
-    def delete_all_backups(self) -> Tuple[bool, str]:
-        """Obriši sve backup-e i metadata odmah"""
-        try:
-            # Briše foldere backupa
-            for backup_type in ['full', 'incremental', 'differential']:
-                type_dir = os.path.join(self.backup_root, backup_type)
-                if os.path.exists(type_dir):
-                    rmtree(type_dir)
-                    if self.logger:
-                        self.logger.logger.info(f"Deleted backup folder: {type_dir}")
-
-            # Provjeri .metadata folder i backup_history.json
-            if os.path.exists(self.metadata_dir):
-                rmtree(self.metadata_dir)
-                if self.logger:
-                    self.logger.logger.info(f"Deleted metadata directory: {self.metadata_dir}")
-
-            # Ponovo kreiraj prazne foldere da sustav ne puca
-            os.makedirs(self.metadata_dir, exist_ok=True)
-            os.makedirs(os.path.join(self.backup_root, 'full'), exist_ok=True)
-            os.makedirs(os.path.join(self.backup_root, 'incremental'), exist_ok=True)
-            os.makedirs(os.path.join(self.backup_root, 'differential'), exist_ok=True)
-
-            self.backup_history = {'backups': []}
-
-            return True, "Svi backup-i i metadata su obrisani"
-        except Exception as e:
-            if self.logger:
-                self.logger.logger.error(f"Greška pri brisanju backup-a: {e}")
-            return False, str(e)
+"""
+Jezgra sustava za backup
+Implementira sve tri strategije: Full, Incremental, Differential
+"""
+
+import bisect
+import hashlib
+import os
+import shutil
+import json
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from typing import Dict, Tuple
+import time
+
+from contextlib import contextmanager
+from shutil import rmtree
+
+from file_io import REFLINK_SUPPORTED, clone_file, fast_copy
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _json_default(value):
+    # datetime se sprema kao ISO string, bez kopiranja zapisa
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} nije JSON serijalizabilan")
+
+
+def _backup_sort_key(backup: Dict) -> datetime:
+    return backup['timestamp']
+
+
+@contextmanager
+def _file_lock(lock_path: str):
+    """Ekskluzivni lock između procesa (GUI i scheduler servis dijele isti backup_root)"""
+    with open(lock_path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _raise_walk_error(error: OSError):
+    raise error
+
+
+# scandir/stat relativno na otvoreni direktorij (openat/fstatat) - nije dostupno na Windowsima
+_DIR_FD_SUPPORTED = os.scandir in os.supports_fd and os.open in os.supports_dir_fd
+_DIR_OPEN_FLAGS = os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0)
+
+
+def _iter_scandir(directory: str):
+    """Rekurzivno prolazi direktorij preko os.scandir, vraća (relativna_putanja, DirEntry) za datoteke.
+    DirEntry.stat() treba pozvati prije sljedeće iteracije (direktorij je otvoren samo dok se obrađuje)."""
+    if _DIR_FD_SUPPORTED:
+        dir_fd = os.open(directory, _DIR_OPEN_FLAGS)
+        try:
+            yield from _iter_scandir_at(dir_fd, '')
+        finally:
+            os.close(dir_fd)
+        return
+    
+    stack = [(directory, '')]
+    while stack:
+        path, prefix = stack.pop()
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir():
+                    # kao os.walk: ne ulazi u symlinkane direktorije
+                    if not entry.is_symlink():
+                        stack.append((entry.path, prefix + entry.name + os.sep))
+                else:
+                    yield prefix + entry.name, entry
+
+
+def _iter_scandir_at(dir_fd: int, prefix: str):
+    """Kao _iter_scandir, ali kernel ne razrješava cijelu putanju za svaki stat/open"""
+    with os.scandir(dir_fd) as it:
+        for entry in it:
+            if entry.is_dir():
+                if not entry.is_symlink():
+                    sub_fd = os.open(entry.name, _DIR_OPEN_FLAGS, dir_fd=dir_fd)
+                    try:
+                        yield from _iter_scandir_at(sub_fd, prefix + entry.name + os.sep)
+                    finally:
+                        os.close(sub_fd)
+            else:
+                yield prefix + entry.name, entry
+
+
+def _scan_directory(path: str, prefix: str) -> Tuple[Dict[str, Dict], list]:
+    """Skenira jedan direktorij bez rekurzije, vraća (datoteke, poddirektoriji)"""
+    files = {}
+    subdirs = []
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_dir():
+                if not entry.is_symlink():
+                    subdirs.append((entry.path, prefix + entry.name + os.sep))
+            else:
+                st = entry.stat()
+                files[prefix + entry.name] = {
+                    'modified': st.st_mtime,
+                    'size': st.st_size
+                }
+    return files, subdirs
+
+
+class BatchCopier:
+    """Drži više kopiranja istovremeno u tijeku umjesto jedno-po-jedno"""
+
+    def __init__(self, max_workers: int = 8, max_pending: int = 256, reflink: bool = False):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.max_pending = max_pending
+        self.reflink = reflink
+        self.reflink_used = False
+        self.pending = deque()
+
+    def submit_copy(self, src: str, dst: str):
+        # kad je red pun, čekaj najstarije kopiranje
+        if len(self.pending) >= self.max_pending:
+            self._wait_oldest()
+        self.pending.append(self.executor.submit(fast_copy, src, dst, self.reflink))
+
+    def drain(self):
+        while self.pending:
+            self._wait_oldest()
+
+    def _wait_oldest(self):
+        if self.pending.popleft().result():
+            self.reflink_used = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.executor.shutdown(wait=True, cancel_futures=exc_type is not None)
+        return False
+
+
+class BackupEngine:
+    def __init__(self, backup_root: str, logger=None, integrity_checker=None,
+                 copy_workers: int = 8, scan_workers: int = 4):
+        self.backup_root = backup_root
+        self.logger = logger
+        self.integrity_checker = integrity_checker
+        self.copy_workers = copy_workers
+        self.scan_workers = scan_workers
+        self.metadata_dir = os.path.join(backup_root, '.metadata')
+        self.backup_history_file = os.path.join(self.metadata_dir, 'backup_history.json')
+        # popis datoteka svakog backupa je zasebno, povijest drži samo sažetak
+        self.files_dir = os.path.join(self.metadata_dir, 'files')
+        self.files_cache_file = os.path.join(self.metadata_dir, 'files_cache.json')
+        # završeni backupi, jedan JSON po retku - DR metrike čitaju samo kraj datoteke
+        self.completed_index_file = os.path.join(self.metadata_dir, 'completed_index.jsonl')
+        # izvan .metadata jer ga delete_all_backups briše
+        self.lock_file = os.path.join(backup_root, '.lock')
+        
+        os.makedirs(self.metadata_dir, exist_ok=True)
+        os.makedirs(os.path.join(backup_root, 'full'), exist_ok=True)
+        os.makedirs(os.path.join(backup_root, 'incremental'), exist_ok=True)
+        os.makedirs(os.path.join(backup_root, 'differential'), exist_ok=True)
+        
+        # stat prije čitanja - izmjena između njih se vidi kao nova verzija
+        self._history_stamp = self._history_file_stamp()
+        self.backup_history = self._load_history()
+        self._serialized_entries = []
+        self._index_history()
+        self.files_cache = self._load_files_cache()
+        self._files_cache_dirty = False
+        self._used_fingerprints = set()
+        self.reflink_supported = self._probe_reflink()
+    
+    def _load_history(self) -> Dict:
+        if os.path.exists(self.backup_history_file):
+            with open(self.backup_history_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+                # osiguraj da svi timestampi budu datetime
+                for b in data.get('backups', []):
+                    if isinstance(b.get('timestamp'), str):
+                        try:
+                            b['timestamp'] = datetime.fromisoformat(b['timestamp'])
+                        except Exception:
+                            b['timestamp'] = datetime.now()
+                    # starije povijesti imaju popis datoteka ugrađen u zapis - premjesti ga van
+                    if 'files' in b:
+                        self._save_files(b['id'], b.pop('files'))
+                # povijest se drži sortirana po vremenu, vidi _add_to_history
+                data.setdefault('backups', []).sort(key=_backup_sort_key)
+                return data
+        return {'backups': []}
+    
+    def _history_file_stamp(self):
+        """os.replace daje novi inode, pa (inode, mtime, veličina) mijenja se sa svakim spremanjem"""
+        try:
+            st = os.stat(self.backup_history_file)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+    
+    def _refresh_history(self):
+        """Ponovno učitaj povijest ako ju je u međuvremenu spremio drugi proces"""
+        stamp = self._history_file_stamp()
+        if stamp == self._history_stamp:
+            return
+        self._history_stamp = stamp
+        self.backup_history = self._load_history()
+        self._serialized_entries = []
+        self._index_history()
+    
+    def _index_history(self):
+        """Zapamti vremena zadnjeg backupa da se povijest ne pretražuje pri svakom backupu"""
+        self._last_completed_ts = None
+        self._last_full_ts = None
+        self._completed_count = 0
+        for backup in self.backup_history['backups']:
+            self._update_last_times(backup)
+    
+    def _update_last_times(self, backup: Dict):
+        if backup.get('status') != 'completed':
+            return
+        ts = backup['timestamp'].timestamp()
+        self._completed_count += 1
+        self._last_completed_ts = ts
+        if backup.get('type') == 'full':
+            self._last_full_ts = ts
+    
+    def _add_to_history(self, metadata: Dict):
+        """Dodaj backup u povijest (sortirano umetanje) i spremi.
+        Pod lockom se prvo učitaju zapisi drugog procesa da se ne pregaze."""
+        # unix vrijeme uz ISO timestamp - čitatelji povijesti ga ne moraju parsirati
+        metadata['timestamp_unix'] = metadata['timestamp'].timestamp()
+        with _file_lock(self.lock_file):
+            self._refresh_history()
+            bisect.insort(self.backup_history['backups'], metadata, key=_backup_sort_key)
+            self._update_last_times(metadata)
+            self._save_history()
+            if metadata.get('status') == 'completed':
+                self._append_completed_index(metadata)
+    
+    def _append_completed_index(self, metadata: Dict):
+        """Dodaje redak u completed_index.jsonl; n je redni broj završenog backupa"""
+        entry = {
+            'n': self._completed_count,
+            'id': metadata['id'],
+            'type': metadata['type'],
+            'timestamp_unix': metadata['timestamp_unix'],
+            'duration_seconds': metadata.get('duration_seconds'),
+            'file_count': metadata.get('file_count', 0),
+            'size_bytes': metadata.get('size_bytes', 0)
+        }
+        with open(self.completed_index_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+    
+    def _save_history(self):
+        # osiguraj da folder postoji
+        os.makedirs(self.metadata_dir, exist_ok=True)
+
+        # zapisi se ne mijenjaju nakon dodavanja, pa se serijaliziraju samo novi;
+        # prefiks koji su isti objekti kao pri prošlom spremanju se ponovno koristi
+        backups = self.backup_history.get('backups', [])
+        cached = self._serialized_entries
+        reused = 0
+        while reused < len(cached) and reused < len(backups) and cached[reused][0] is backups[reused]:
+            reused += 1
+        del cached[reused:]
+        for b in backups[reused:]:
+            cached.append((b, json.dumps(b, default=_json_default)))
+
+        # isti izlaz kao json.dumps({'backups': [...]}); jedan write + os.replace da pad usred pisanja ne ošteti povijest
+        data = ('{"backups": [' + ', '.join(part for _, part in cached) + ']}').encode('utf-8')
+        tmp_file = self.backup_history_file + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.backup_history_file)
+        self._history_stamp = self._history_file_stamp()
+    
+    def _save_files(self, backup_id: str, file_list: Dict[str, Dict]):
+        os.makedirs(self.files_dir, exist_ok=True)
+        with open(os.path.join(self.files_dir, f'{backup_id}.json'), 'w', encoding='utf-8') as f:
+            f.write(json.dumps(file_list))
+    
+    def get_files(self, backup_id: str) -> Dict[str, Dict]:
+        """Popis datoteka backupa (učitava se tek kad zatreba)"""
+        files_path = os.path.join(self.files_dir, f'{backup_id}.json')
+        if os.path.exists(files_path):
+            with open(files_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {}
+    
+    def _get_file_list(self, directory: str) -> Dict[str, Dict]:
+        try:
+            return self._get_file_list_parallel(directory)
+        except Exception as e:
+            if self.logger:
+                self.logger.logger.error(f"Greska pri citanju datoteka: {e}")
+            return {}
+    
+    def _get_file_list_parallel(self, directory: str, workers: int = None) -> Dict[str, Dict]:
+        """Svaki direktorij je zaseban zadatak, pa se scandir/stat pozivi preklapaju"""
+        file_list = {}
+        with ThreadPoolExecutor(max_workers=workers or self.scan_workers) as executor:
+            pending = {executor.submit(_scan_directory, directory, '')}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    files, subdirs = future.result()
+                    file_list.update(files)
+                    for path, prefix in subdirs:
+                        pending.add(executor.submit(_scan_directory, path, prefix))
+        return file_list
+    
+    def _probe_reflink(self) -> bool:
+        """Jednom provjeri podržava li datotečni sustav backup_root-a reflink, da se ioctl ne ponavlja uzalud"""
+        if not REFLINK_SUPPORTED:
+            return False
+        probe_src = os.path.join(self.metadata_dir, '.reflink_probe')
+        probe_dst = probe_src + '.clone'
+        try:
+            with open(probe_src, 'wb') as f:
+                f.write(b'reflink')
+            with open(probe_src, 'rb') as src, open(probe_dst, 'wb') as dst:
+                return clone_file(src.fileno(), dst.fileno())
+        except OSError:
+            return False
+        finally:
+            for path in (probe_src, probe_dst):
+                if os.path.exists(path):
+                    os.remove(path)
+    
+    def _copy_tree(self, source_dir: str, backup_dir: str) -> bool:
+        """Kopira cijelo stablo (zamjena za shutil.copytree koji interno koristi copy2).
+        Vraća True ako je barem jedna datoteka klonirana (reflink)."""
+        reflink_used = False
+        for root, dirs, files in os.walk(source_dir, onerror=_raise_walk_error):
+            target_root = os.path.normpath(os.path.join(backup_dir, os.path.relpath(root, source_dir)))
+            os.makedirs(target_root, exist_ok=True)
+            # prefiksi jednom po direktoriju, putanje datoteka se samo spajaju
+            source_prefix = os.path.join(root, '')
+            target_prefix = os.path.join(target_root, '')
+            for file in files:
+                if fast_copy(source_prefix + file, target_prefix + file,
+                              self.reflink_supported):
+                    reflink_used = True
+        return reflink_used
+    
+    def _copy_changed_files(self, source_dir: str, backup_dir: str, since: float) -> Tuple[Dict[str, Dict], bool]:
+        """Kopira datoteke izmijenjene nakon since, više kopiranja istovremeno u tijeku.
+        Vraća (popis datoteka, je li korišten reflink)."""
+        file_list = {}
+        previous_index = self._previous_backup_index(source_dir, since)
+        # prefiksi se računaju jednom, putanje se u petlji samo spajaju
+        source_prefix = os.path.join(source_dir, '')
+        target_prefix = os.path.join(backup_dir, '')
+        created_dirs = set()
+        sep = os.sep
+        self._used_fingerprints = set()
+        with BatchCopier(max_workers=self.copy_workers, reflink=self.reflink_supported) as copier:
+            # lokalne reference - petlja se izvršava jednom po datoteci izvora
+            # pa izbjegavamo ponovljena traženja atributa i globalnih imena
+            get_previous = previous_index.get
+            submit_copy = copier.submit_copy
+            makedirs = os.makedirs
+            for relative_path, entry in _iter_scandir(source_dir):
+                st = entry.stat()
+                mtime = st.st_mtime
+                if mtime <= since:
+                    continue
+                size = st.st_size
+                target_path = target_prefix + relative_path
+                target_dir = target_path.rpartition(sep)[0]
+                if target_dir not in created_dirs:
+                    makedirs(target_dir, exist_ok=True)
+                    created_dirs.add(target_dir)
+                
+                # nepromijenjena datoteka iz prethodnog backupa -> hardlink umjesto kopije
+                linked = False
+                source_path = source_prefix + relative_path
+                previous = get_previous(relative_path)
+                if previous and previous['size'] == size:
+                    previous_path = previous['backup_dir'] + sep + relative_path
+                    if (previous['mtime'] == mtime
+                            or self._same_content(source_path, st, previous_path)):
+                        linked = self._link_previous(previous_path, target_path)
+                        if linked:
+                            # hardlink dijeli inode sa starom kopijom - zapiši njen stvarni mtime
+                            # (utime bi promijenio i prethodne backupe)
+                            mtime = os.stat(target_path).st_mtime
+                if not linked:
+                    submit_copy(source_path, target_path)
+                
+                file_list[relative_path] = {'modified': mtime, 'size': size, 'linked': linked}
+            copier.drain()
+        self._prune_files_cache()
+        if self._files_cache_dirty:
+            self._save_files_cache()
+        return file_list, copier.reflink_used
+    
+    def _previous_backup_index(self, source_dir: str, since: float) -> Dict[str, Dict]:
+        """Najnovija kopija svake datoteke u prethodnim backup-ima istog izvora"""
+        index = {}
+        for backup in reversed(self.backup_history.get('backups', [])):
+            # stariji backupi ne mogu imati datoteku izmijenjenu nakon since
+            if backup['timestamp'].timestamp() < since:
+                break
+            if backup.get('status') != 'completed' or backup.get('source') != source_dir:
+                continue
+            backup_dir = os.path.join(self.backup_root, backup['type'], backup['id'])
+            for relative_path, info in self.get_files(backup['id']).items():
+                if relative_path not in index:
+                    index[relative_path] = {
+                        'size': info['size'],
+                        'mtime': info['modified'],
+                        'backup_dir': backup_dir
+                    }
+        return index
+    
+    def _same_content(self, source_path: str, source_stat: os.stat_result, previous_path: str) -> bool:
+        """Datoteka je "dirnuta" (novi mtime) ali sadržaj je isti kao u prethodnom backupu"""
+        try:
+            previous_stat = os.stat(previous_path)
+            return (self._file_fingerprint(source_path, source_stat)
+                    == self._file_fingerprint(previous_path, previous_stat))
+        except OSError:
+            return False
+    
+    def _file_fingerprint(self, path: str, st: os.stat_result) -> str:
+        """BLAKE2 otisak sadržaja, keširan po (uređaj, inode, mtime, veličina)"""
+        key = f"{st.st_dev}:{st.st_ino}:{st.st_mtime_ns}:{st.st_size}"
+        self._used_fingerprints.add(key)
+        fingerprint = self.files_cache.get(key)
+        if fingerprint is None:
+            hash_obj = hashlib.blake2b()
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    hash_obj.update(chunk)
+            fingerprint = hash_obj.hexdigest()
+            self.files_cache[key] = fingerprint
+            self._files_cache_dirty = True
+        return fingerprint
+    
+    def _load_files_cache(self) -> Dict[str, str]:
+        try:
+            with open(self.files_cache_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def _prune_files_cache(self):
+        """Izbaci otiske koji nisu korišteni u ovom backupu (stari inode/mtime ključevi)"""
+        if len(self.files_cache) == len(self._used_fingerprints):
+            return
+        self.files_cache = {key: fingerprint for key, fingerprint in self.files_cache.items()
+                            if key in self._used_fingerprints}
+        self._files_cache_dirty = True
+    
+    def _save_files_cache(self):
+        tmp_file = self.files_cache_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(self.files_cache))
+        os.replace(tmp_file, self.files_cache_file)
+        self._files_cache_dirty = False
+    
+    def _link_previous(self, previous_path: str, target_path: str) -> bool:
+        """Hardlink na kopiju iz prethodnog backupa; False ako nije moguće (drugi disk, obrisan backup...)"""
+        try:
+            os.link(previous_path, target_path)
+            return True
+        except OSError:
+            return False
+    
+    # --- FULL BACKUP ---
+    def full_backup(self, source_dir: str, backup_id: str = None,
+                    progress_cb=None, cancel_event=None) -> Tuple[bool, Dict]:
+        """progress_cb/cancel_event se prosljeđuju kreiranju manifesta"""
+        if backup_id is None:
+            backup_id = f"full_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        
+        backup_dir = os.path.join(self.backup_root, 'full', backup_id)
+        metadata = {
+            'id': backup_id,
+            'type': 'full',
+            'timestamp': datetime.now(),
+            'source': source_dir,
+            'status': 'in_progress'
+        }
+        
+        try:
+            start_time = time.time()
+            if self.logger:
+                self.logger.log_backup_start('FULL', source_dir, backup_dir)
+            
+            if os.path.exists(backup_dir):
+                shutil.rmtree(backup_dir)
+            
+            reflink_used = self._copy_tree(source_dir, backup_dir)
+            
+            file_list = self._get_file_list(backup_dir)
+            duration = time.time() - start_time
+            
+            metadata.update({
+                'file_count': len(file_list),
+                'size_bytes': sum(info['size'] for info in file_list.values()),
+                'duration_seconds': duration,
+                'reflink_used': reflink_used,
+                'status': 'completed'
+            })
+            self._save_files(backup_id, file_list)
+            
+            if self.integrity_checker:
+                manifest_path = os.path.join(backup_dir, 'MANIFEST.json')
+                self.integrity_checker.create_backup_manifest(backup_dir, manifest_path,
+                                                              progress_cb, cancel_event)
+            
+            self._add_to_history(metadata)
+            
+            if self.logger:
+                self.logger.log_backup_complete(backup_id, metadata['file_count'], 
+                                               metadata['size_bytes'], duration)
+            
+            return True, metadata
+        except Exception as e:
+            metadata['status'] = 'failed'
+            metadata['error'] = str(e)
+            self._add_to_history(metadata)
+            if self.logger:
+                self.logger.log_backup_error(backup_id, str(e))
+            return False, metadata
+    
+    # --- INCREMENTAL BACKUP ---
+    def incremental_backup(self, source_dir: str, backup_id: str = None,
+                           progress_cb=None, cancel_event=None) -> Tuple[bool, Dict]:
+        if backup_id is None:
+            backup_id = f"incremental_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        backup_dir = os.path.join(self.backup_root, 'incremental', backup_id)
+        metadata = {'id': backup_id, 'type': 'incremental', 'timestamp': datetime.now(),
+                    'source': source_dir, 'status': 'in_progress'}
+        
+        try:
+            start_time = time.time()
+            if self.logger:
+                self.logger.log_backup_start('INCREMENTAL', source_dir, backup_dir)
+            
+            # zadnji backup je možda napravio drugi proces
+            self._refresh_history()
+            last_backup_time = self._get_last_backup_time()
+            
+            if os.path.exists(backup_dir):
+                shutil.rmtree(backup_dir)
+            os.makedirs(backup_dir)
+            
+            file_list, reflink_used = self._copy_changed_files(source_dir, backup_dir, last_backup_time)
+            
+            duration = time.time() - start_time
+            metadata.update({
+                'file_count': len(file_list),
+                'size_bytes': sum(info['size'] for info in file_list.values()),
+                'duration_seconds': duration,
+                'reflink_used': reflink_used,
+                'status': 'completed'
+            })
+            self._save_files(backup_id, file_list)
+            
+            if self.integrity_checker:
+                manifest_path = os.path.join(backup_dir, 'MANIFEST.json')
+                self.integrity_checker.create_backup_manifest(backup_dir, manifest_path,
+                                                              progress_cb, cancel_event)
+            
+            self._add_to_history(metadata)
+            if self.logger:
+                self.logger.log_backup_complete(backup_id, metadata['file_count'], 
+                                               metadata['size_bytes'], duration)
+            return True, metadata
+        except Exception as e:
+            metadata['status'] = 'failed'
+            metadata['error'] = str(e)
+            self._add_to_history(metadata)
+            if self.logger:
+                self.logger.log_backup_error(backup_id, str(e))
+            return False, metadata
+    
+    # --- DIFFERENTIAL BACKUP ---
+    def differential_backup(self, source_dir: str, backup_id: str = None,
+                            progress_cb=None, cancel_event=None) -> Tuple[bool, Dict]:
+        if backup_id is None:
+            backup_id = f"differential_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        backup_dir = os.path.join(self.backup_root, 'differential', backup_id)
+        metadata = {'id': backup_id, 'type': 'differential', 'timestamp': datetime.now(),
+                    'source': source_dir, 'status': 'in_progress'}
+        
+        try:
+            start_time = time.time()
+            if self.logger:
+                self.logger.log_backup_start('DIFFERENTIAL', source_dir, backup_dir)
+            
+            self._refresh_history()
+            last_full_time = self._get_last_full_backup_time()
+            
+            if os.path.exists(backup_dir):
+                shutil.rmtree(backup_dir)
+            os.makedirs(backup_dir)
+            
+            file_list, reflink_used = self._copy_changed_files(source_dir, backup_dir, last_full_time)
+            
+            duration = time.time() - start_time
+            metadata.update({
+                'file_count': len(file_list),
+                'size_bytes': sum(info['size'] for info in file_list.values()),
+                'duration_seconds': duration,
+                'reflink_used': reflink_used,
+                'status': 'completed'
+            })
+            self._save_files(backup_id, file_list)
+            
+            if self.integrity_checker:
+                manifest_path = os.path.join(backup_dir, 'MANIFEST.json')
+                self.integrity_checker.create_backup_manifest(backup_dir, manifest_path,
+                                                              progress_cb, cancel_event)
+            
+            self._add_to_history(metadata)
+            if self.logger:
+                self.logger.log_backup_complete(backup_id, metadata['file_count'], 
+                                               metadata['size_bytes'], duration)
+            return True, metadata
+        except Exception as e:
+            metadata['status'] = 'failed'
+            metadata['error'] = str(e)
+            self._add_to_history(metadata)
+            if self.logger:
+                self.logger.log_backup_error(backup_id, str(e))
+            return False, metadata
+    
+    # --- POMOĆNE FUNKCIJE ---
+    def _get_last_backup_time(self) -> float:
+        if self._last_completed_ts is not None:
+            return self._last_completed_ts
+        return (datetime.now() - timedelta(days=365)).timestamp()
+    
+    def _get_last_full_backup_time(self) -> float:
+        if self._last_full_ts is not None:
+            return self._last_full_ts
+        return (datetime.now() - timedelta(days=365)).timestamp()
+    
+    def get_backup_summary(self) -> Dict:
+        """Vrati sažetak svih backup-a"""
+        summary = {
+            'total_backups': 0,
+            'total_size_bytes': 0,
+            'backups': []
+        }
+        self._refresh_history()
+        
+        # povijest je već sortirana po vremenu, newest first je samo obrnuti redoslijed
+        for backup in reversed(self.backup_history.get('backups', [])):
+            summary['backups'].append({
+                'id': backup['id'],
+                'type': backup['type'],
+                'files': backup.get('file_count', 0),
+                'size_mb': backup.get('size_bytes', 0) / (1024*1024),
+                'status': backup.get('status', 'unknown'),
+                'timestamp': backup['timestamp']
+            })
+            summary['total_backups'] += 1
+            summary['total_size_bytes'] += backup.get('size_bytes', 0)
+        
+        return summary
+
+    # --- DELETE ALL BACKUPS ---
+    def delete_all_backups(self) -> Tuple[bool, str]:
+        """Obriši sve backup-e i metadata odmah"""
+        try:
+            # drugi proces ne smije pisati povijest dok se brišu backupi
+            with _file_lock(self.lock_file):
+                # Briše foldere backupa
+                for backup_type in ['full', 'incremental', 'differential']:
+                    type_dir = os.path.join(self.backup_root, backup_type)
+                    if os.path.exists(type_dir):
+                        rmtree(type_dir)
+                        if self.logger:
+                            self.logger.logger.info(f"Deleted backup folder: {type_dir}")
+
+                # Provjeri .metadata folder i backup_history.json
+                if os.path.exists(self.metadata_dir):
+                    rmtree(self.metadata_dir)
+                    if self.logger:
+                        self.logger.logger.info(f"Deleted metadata directory: {self.metadata_dir}")
+
+                # Ponovo kreiraj prazne foldere da sustav ne puca
+                os.makedirs(self.metadata_dir, exist_ok=True)
+                os.makedirs(os.path.join(self.backup_root, 'full'), exist_ok=True)
+                os.makedirs(os.path.join(self.backup_root, 'incremental'), exist_ok=True)
+                os.makedirs(os.path.join(self.backup_root, 'differential'), exist_ok=True)
+
+                self.backup_history = {'backups': []}
+                self._serialized_entries = []
+                self._history_stamp = None
+                self._index_history()
+                self.files_cache = {}
+                self._files_cache_dirty = False
+
+            return True, "Svi backup-i i metadata su obrisani"
+        except Exception as e:
+            if self.logger:
+                self.logger.logger.error(f"Greška pri brisanju backup-a: {e}")
+            return False, str(e)
@@ -4,22 +4,50 @@ Cloud Sync - Automatski upload svih backup-a na S3
 """
 
 import os
+import sys
 import json
+import time
 import boto3
+from boto3.s3.transfer import TransferConfig, create_transfer_manager
+from botocore.config import Config
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List
 
+# botocore racuna CRC32C samo uz awscrt (botocore[crt]); bez njega CRC32
+try:
+    import awscrt  # noqa: F401
+    S3_CHECKSUM_ALGORITHM = 'CRC32C'
+except ImportError:
+    S3_CHECKSUM_ALGORITHM = 'CRC32'
+
+
+def _list_backup_dirs(type_dir: str) -> List[str]:
+    """Putanje backup direktorija jednog tipa - scandir umjesto exists + listdir + isdir po backupu.
+    FileNotFoundError ako direktorij tipa ne postoji."""
+    with os.scandir(type_dir) as it:
+        return [entry.path for entry in it if entry.is_dir(follow_symlinks=False)]
+
+
 class CloudSync:
     
+    # napredak se ispisuje svakih N datoteka ili svakih N sekundi, ne za svaku datoteku
+    PROGRESS_EVERY_FILES = 500
+    PROGRESS_EVERY_SECONDS = 2.0
     
     def __init__(self, config_file: str = 'advanced_config.json', logger=None):
         self.config_file = config_file
         self.config = self._load_config()
         self.logger = logger
         self.s3_client = None
+        self.transfer_mgr = None
+        self.upload_args = {}
         self.backup_root = './backups'
         
+        self._stdout_write = sys.stdout.write
+        self._is_tty = sys.stdout.isatty()
+        self._last_progress = 0.0
+        
         self._init_s3_client()
     
     def _load_config(self) -> Dict:
@@ -40,12 +68,41 @@ class CloudSync:
             return
         
         try:
+            # mnogo malih objekata: propusnost raste s brojem istovremenih zahtjeva
+            max_concurrency = aws_config.get('max_concurrency', 64)
+            # veći pool i keep-alive da se TLS veze ponovno koriste između uploada;
+            # pool mora imati barem onoliko veza koliko ima istovremenih uploada
+            client_config = Config(
+                max_pool_connections=max(64, max_concurrency),
+                retries={'mode': 'adaptive', 'max_attempts': 10},
+                tcp_keepalive=True,
+                connect_timeout=5,
+                read_timeout=60,
+                s3={
+                    'addressing_style': 'virtual',
+                    'use_accelerate_endpoint': aws_config.get('accelerate', False)
+                }
+            )
             self.s3_client = boto3.client(
                 's3',
                 aws_access_key_id=aws_config.get('access_key'),
                 aws_secret_access_key=aws_config.get('secret_key'),
-                region_name=aws_config.get('region', 'eu-central-1')
+                region_name=aws_config.get('region', 'eu-central-1'),
+                config=client_config
+            )
+            # TransferManager paralelizira uploade i radi multipart za velike datoteke
+            self.transfer_config = TransferConfig(
+                multipart_threshold=8 * 1024 * 1024,
+                multipart_chunksize=8 * 1024 * 1024,
+                max_concurrency=max_concurrency,
+                use_threads=True
             )
+            self.transfer_mgr = create_transfer_manager(self.s3_client, self.transfer_config)
+            # prijelaz u Glacier radi lifecycle pravilo bucketa; CRC umjesto MD5 za integritet
+            self.upload_args = {
+                'StorageClass': aws_config.get('storage_class', 'INTELLIGENT_TIERING'),
+                'ChecksumAlgorithm': S3_CHECKSUM_ALGORITHM
+            }
             print("S3 klijent inicijaliziran")
         except Exception as e:
             print(f"Greška pri inicijalizaciji S3: {e}")
@@ -71,68 +128,70 @@ class CloudSync:
         print(f"CLOUD SYNC - Sinhronizacija ./backups → {bucket}")
         print(f"{'='*80}\n")
         
+        uploads = []
+        root_prefix_len = len(os.path.join(self.backup_root, ''))
+        
         # Prođi kroz sve backup-e
         for backup_type in ['full', 'incremental', 'differential']:
-            type_dir = os.path.join(self.backup_root, backup_type)
-            
-            if not os.path.exists(type_dir):
+            try:
+                backup_entries = _list_backup_dirs(os.path.join(self.backup_root, backup_type))
+            except FileNotFoundError:
                 continue
             
             print(f"Obrađujem {backup_type} backup-e...")
             
-            for backup_id in os.listdir(type_dir):
-                backup_path = os.path.join(type_dir, backup_id)
-                
-                if not os.path.isdir(backup_path):
-                    continue
-                
+            for backup_path in backup_entries:
                 # Upload datoteke iz backup-a
                 for root, dirs, files in os.walk(backup_path):
+                    # S3 key prefiks se računa jednom po direktoriju
+                    local_prefix = root + os.sep
+                    key_prefix = "backups/" + local_prefix[root_prefix_len:]
                     for file in files:
-                        local_file = os.path.join(root, file)
-                        
-                        # Generiraj S3 key
-                        relative_path = os.path.relpath(local_file, self.backup_root)
-                        s3_key = f"backups/{relative_path}"
+                        local_file = local_prefix + file
+                        s3_key = key_prefix + file
                         
                         file_size = os.path.getsize(local_file)
                         results['total_files'] += 1
                         results['total_size_bytes'] += file_size
                         
-                        try:
-                            # Upload na S3
-                            self.s3_client.upload_file(
-                                local_file,
-                                bucket,
-                                s3_key,
-                                ExtraArgs={'StorageClass': 'GLACIER'}
-                            )
-                            
-                            results['successful_uploads'] += 1
-                            results['uploaded_files'].append({
-                                'local_path': local_file,
-                                's3_path': s3_key,
-                                'size_bytes': file_size,
-                                'timestamp': datetime.now().isoformat()
-                            })
-                            
-                            size_mb = file_size / (1024*1024)
-                            print(f"   {s3_key} ({size_mb:.2f} MB)")
-                            
-                            if self.logger:
-                                self.logger.logger.info(f"S3 upload: {s3_key}")
-                        
-                        except Exception as e:
-                            results['failed_uploads'] += 1
-                            results['failed_files'].append({
-                                'local_path': local_file,
-                                'error': str(e)
-                            })
-                            
-                            print(f"   {s3_key} - Greška: {e}")
-                            
-                            if self.logger:
-                                self.logger.logger.error(f"S3 upload greška {s3_key}: {e}")
+                        # Upload na S3 (asinkrono, rezultat čekamo na kraju)
+                        future = self.transfer_mgr.upload(
+                            local_file,
+                            bucket,
+                            s3_key,
+                            extra_args=self.upload_args
+                        )
+                        uploads.append((future, local_file, s3_key, file_size))
+        
+        uploaded_bytes = 0
+        for future, local_file, s3_key, file_size in uploads:
+            try:
+                future.result()
+                
+                results['successful_uploads'] += 1
+                results['uploaded_files'].append({
+                    'local_path': local_file,
+                    's3_path': s3_key,
+                    'size_bytes': file_size,
+                    'timestamp': datetime.now().isoformat()
+                })
+                
+                uploaded_bytes += file_size
+                self._progress("Uploadano", results['successful_uploads'], len(uploads), uploaded_bytes)
+            
+            except Exception as e:
+                results['failed_uploads'] += 1
+                results['failed_files'].append({
+                    'local_path': local_file,
+                    'error': str(e)
+                })
+                
+                print(f"   {s3_key} - Greška: {e}")
+                
+                if self.logger:
+                    self.logger.logger.error(f"S3 upload greška {s3_key}: {e}")
+        
+        self._progress("Uploadano", results['successful_uploads'], len(uploads), uploaded_bytes, final=True)
         
         # Summary
         print(f"\n{'='*80}")
@@ -164,39 +223,44 @@ class CloudSync:
         bucket = self.config['aws_s3']['bucket_name']
         type_dir = os.path.join(self.backup_root, backup_type)
         
-        if not os.path.exists(type_dir):
+        try:
+            backup_entries = _list_backup_dirs(type_dir)
+        except FileNotFoundError:
             return {'success': False, 'error': f'Direktorij ne postoji: {type_dir}'}
         
         print(f"\nSinhronizacija {backup_type} backup-a...\n")
         
-        for backup_id in os.listdir(type_dir):
-            backup_path = os.path.join(type_dir, backup_id)
-            
-            if not os.path.isdir(backup_path):
-                continue
-            
+        uploads = []
+        root_prefix_len = len(os.path.join(self.backup_root, ''))
+        for backup_path in backup_entries:
             for root, dirs, files in os.walk(backup_path):
+                local_prefix = root + os.sep
+                key_prefix = "backups/" + local_prefix[root_prefix_len:]
                 for file in files:
-                    local_file = os.path.join(root, file)
-                    relative_path = os.path.relpath(local_file, self.backup_root)
-                    s3_key = f"backups/{relative_path}"
+                    local_file = local_prefix + file
+                    s3_key = key_prefix + file
                     
-                    try:
-                        self.s3_client.upload_file(
-                            local_file,
-                            bucket,
-                            s3_key,
-                            ExtraArgs={'StorageClass': 'GLACIER'}
-                        )
-                        
-                        results['uploaded_count'] += 1
-                        results['total_size_bytes'] += os.path.getsize(local_file)
-                        print(f" {s3_key}")
-                    
-                    except Exception as e:
-                        results['failed_count'] += 1
-                        print(f" {s3_key} - {e}")
+                    future = self.transfer_mgr.upload(
+                        local_file,
+                        bucket,
+                        s3_key,
+                        extra_args=self.upload_args
+                    )
+                    uploads.append((future, local_file, s3_key))
         
+        for future, local_file, s3_key in uploads:
+            try:
+                future.result()
+                
+                results['uploaded_count'] += 1
+                results['total_size_bytes'] += os.path.getsize(local_file)
+                self._progress("Uploadano", results['uploaded_count'], len(uploads), results['total_size_bytes'])
+            
+            except Exception as e:
+                results['failed_count'] += 1
+                print(f" {s3_key} - {e}")
+        
+        self._progress("Uploadano", results['uploaded_count'], len(uploads), results['total_size_bytes'], final=True)
         return results
     
     def sync_latest_backup(self) -> Dict:
@@ -209,20 +273,20 @@ class CloudSync:
         latest_time = 0
         
         for backup_type in ['full', 'incremental', 'differential']:
-            type_dir = os.path.join(self.backup_root, backup_type)
-            
-            if not os.path.exists(type_dir):
+            try:
+                it = os.scandir(os.path.join(self.backup_root, backup_type))
+            except FileNotFoundError:
                 continue
             
-            for backup_id in os.listdir(type_dir):
-                backup_path = os.path.join(type_dir, backup_id)
-                
-                if os.path.isdir(backup_path):
-                    backup_time = os.path.getctime(backup_path)
-                    
-                    if backup_time > latest_time:
-                        latest_time = backup_time
-                        latest_backup = (backup_type, backup_id, backup_path)
+            # scandir: is_dir() iz d_type bez syscalla, jedan stat po backupu
+            with it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        backup_time = entry.stat().st_ctime
+                        
+                        if backup_time > latest_time:
+                            latest_time = backup_time
+                            latest_backup = (backup_type, entry.name, entry.path)
         
         if not latest_backup:
             return {'success': False, 'error': 'Nema backup-a za sinhronizaciju'}
@@ -239,27 +303,37 @@ class CloudSync:
         
         print(f"\nSinhronizacija najnovijeg backup-a: {backup_id}\n")
         
+        uploads = []
+        root_prefix_len = len(os.path.join(self.backup_root, ''))
         for root, dirs, files in os.walk(backup_path):
+            local_prefix = root + os.sep
+            key_prefix = "backups/" + local_prefix[root_prefix_len:]
             for file in files:
-                local_file = os.path.join(root, file)
-                relative_path = os.path.relpath(local_file, self.backup_root)
-                s3_key = f"backups/{relative_path}"
+                local_file = local_prefix + file
+                s3_key = key_prefix + file
                 
-                try:
-                    self.s3_client.upload_file(
-                        local_file,
-                        bucket,
-                        s3_key,
-                        ExtraArgs={'StorageClass': 'GLACIER'}
-                    )
-                    
-                    results['uploaded_count'] += 1
-                    print(f" {s3_key}")
+                future = self.transfer_mgr.upload(
+                    local_file,
+                    bucket,
+                    s3_key,
+                    extra_args=self.upload_args
+                )
+                uploads.append((future, s3_key, os.path.getsize(local_file)))
+        
+        uploaded_bytes = 0
+        for future, s3_key, file_size in uploads:
+            try:
+                future.result()
                 
-                except Exception as e:
-                    results['failed_count'] += 1
-                    print(f" {s3_key} - {e}")
+                results['uploaded_count'] += 1
+                uploaded_bytes += file_size
+                self._progress("Uploadano", results['uploaded_count'], len(uploads), uploaded_bytes)
+            
+            except Exception as e:
+                results['failed_count'] += 1
+                print(f" {s3_key} - {e}")
         
+        self._progress("Uploadano", results['uploaded_count'], len(uploads), uploaded_bytes, final=True)
         return results
     
     def get_s3_backup_list(self) -> List[Dict]:
@@ -326,6 +400,9 @@ class CloudSync:
         
         print(f"\nBrisanje backup-a starijih od {days} dana...\n")
         
+        # ključ -> veličina, briše se u paketima od najviše 1000 objekata
+        batch = {}
+        
         try:
             paginator = self.s3_client.get_paginator('list_objects_v2')
             pages = paginator.paginate(Bucket=bucket, Prefix='backups/')
@@ -334,23 +411,63 @@ class CloudSync:
                 if 'Contents' in page:
                     for obj in page['Contents']:
                         if obj['LastModified'] < cutoff_date:
-                            try:
-                                self.s3_client.delete_object(Bucket=bucket, Key=obj['Key'])
-                                
-                                results['deleted_count'] += 1
-                                results['total_size_freed_bytes'] += obj['Size']
-                                results['deleted_files'].append(obj['Key'])
-                                
-                                print(f" Obrisan: {obj['Key']}")
+                            batch[obj['Key']] = obj['Size']
                             
-                            except Exception as e:
-                                print(f" Greška pri brisanju {obj['Key']}: {e}")
+                            if len(batch) == 1000:
+                                self._delete_batch(bucket, batch, results)
+                                batch = {}
+            
+            if batch:
+                self._delete_batch(bucket, batch, results)
         
         except Exception as e:
             print(f"Greška pri čitanju S3: {e}")
         
+        self._progress("Obrisano", results['deleted_count'], None,
+                       results['total_size_freed_bytes'], final=True)
         print(f"\nOslobodjeno prostora: {results['total_size_freed_bytes'] / (1024*1024*1024):.2f} GB")
         
         return results
+    
+    def _delete_batch(self, bucket: str, batch: Dict[str, int], results: Dict):
+        """Briše paket objekata jednim DeleteObjects zahtjevom"""
+        try:
+            response = self.s3_client.delete_objects(
+                Bucket=bucket,
+                Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+            )
+        except Exception as e:
+            print(f" Greška pri brisanju {len(batch)} objekata: {e}")
+            return
+        
+        failed_keys = set()
+        for error in response.get('Errors', []):
+            failed_keys.add(error['Key'])
+            print(f" Greška pri brisanju {error['Key']}: {error.get('Message')}")
+        
+        for key, size in batch.items():
+            if key in failed_keys:
+                continue
+            
+            results['deleted_count'] += 1
+            results['total_size_freed_bytes'] += size
+            results['deleted_files'].append(key)
         
-   
+        self._progress("Obrisano", results['deleted_count'], None, results['total_size_freed_bytes'])
+    
+    def _progress(self, label: str, done: int, total: int, size_bytes: int, final: bool = False):
+        """Povremeni ispis napretka umjesto print-a za svaku datoteku"""
+        now = time.monotonic()
+        if not final and done % self.PROGRESS_EVERY_FILES and now - self._last_progress < self.PROGRESS_EVERY_SECONDS:
+            return
+        self._last_progress = now
+        
+        count = f"{done}/{total}" if total is not None else f"{done}"
+        msg = f"{label}: {count} datoteka ({size_bytes / (1024*1024):.2f} MB)"
+        if self._is_tty:
+            # terminal: prepiši isti redak
+            self._stdout_write(f"\r {msg}" + ("\n" if final else ""))
+        elif self.logger:
+            self.logger.logger.info(msg)
+        else:
+            self._stdout_write(f" {msg}\n")
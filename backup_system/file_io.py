@@ -0,0 +1,148 @@
+"""
+Brze datotečne operacije zajedničke backupu, restoreu i provjeri integriteta
+Kopiranje kroz kernel (reflink, copy_file_range, sendfile, mmap) i posix_fadvise savjeti
+"""
+
+import errno
+import mmap
+import os
+import shutil
+import sys
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+# Greške koje znače da kernel ne podržava kopiranje između ova dva fd-a
+_KERNEL_COPY_UNSUPPORTED = {errno.ENOSYS, errno.EINVAL, errno.ENOTSOCK,
+                            errno.EXDEV, errno.EOPNOTSUPP, errno.EBADF}
+
+
+_sendfile_copy = None
+if hasattr(os, 'sendfile'):
+    def _sendfile_copy(src_fd, dst_fd, offset, count):
+        return os.sendfile(dst_fd, src_fd, offset, count)
+
+_copy_file_range_copy = None
+if hasattr(os, 'copy_file_range'):
+    def _copy_file_range_copy(src_fd, dst_fd, offset, count):
+        return os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+
+
+def _kernel_copy(src_fd: int, dst_fd: int, size: int) -> bool:
+    """Kopira size bajtova kroz kernel (sendfile / copy_file_range).
+    Vraća False ako platforma to ne podržava ili je kopija kraća od size (izvor se
+    smanjio tijekom kopiranja) - tada je odredište ispražnjeno, ništa nije zapisano."""
+    if size == 0:
+        return True
+
+    for copy_func in (_sendfile_copy, _copy_file_range_copy):
+        if copy_func is None:
+            continue
+        offset = 0
+        try:
+            while offset < size:
+                copied = copy_func(src_fd, dst_fd, offset, size - offset)
+                if copied == 0:
+                    break
+                offset += copied
+            if offset == size:
+                return True
+            # kraća kopija - odredište se prazni da fallback krene od početka
+            os.ftruncate(dst_fd, 0)
+            os.lseek(dst_fd, 0, os.SEEK_SET)
+            return False
+        except OSError as e:
+            # ako je dio već kopiran, nema sigurnog fallbacka
+            if offset or e.errno not in _KERNEL_COPY_UNSUPPORTED:
+                raise
+    return False
+
+
+# velike datoteke bez sendfile/copy_file_range kopiraju se preko mmap-a umjesto read/write petlje
+_MMAP_THRESHOLD = 16 * 1024 * 1024
+_MMAP_WRITE_CHUNK = 4 * 1024 * 1024
+_MMAP_MAX_SIZE_32BIT = 1024 * 1024 * 1024
+
+
+def _mmap_supported(size: int) -> bool:
+    if sys.platform == 'win32' or size < _MMAP_THRESHOLD:
+        return False
+    # na 32-bitnom Pythonu ne mapiraj ogromne datoteke (adresni prostor)
+    return sys.maxsize > 2**32 or size <= _MMAP_MAX_SIZE_32BIT
+
+
+def _mmap_copy(src_fd: int, dst_fd: int, size: int):
+    with mmap.mmap(src_fd, size, access=mmap.ACCESS_READ) as mm:
+        view = memoryview(mm)
+        try:
+            offset = 0
+            while offset < size:
+                offset += os.write(dst_fd, view[offset:offset + _MMAP_WRITE_CHUNK])
+        finally:
+            view.release()
+
+
+# ioctl FICLONE (Linux): copy-on-write klon bez kopiranja podataka (Btrfs, XFS...)
+_FICLONE = 0x40049409
+REFLINK_SUPPORTED = fcntl is not None
+
+
+def clone_file(src_fd: int, dst_fd: int) -> bool:
+    """Reflink klon src u dst; False ako ga datotečni sustav ne podržava"""
+    if fcntl is None:
+        return False
+    try:
+        fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+        return True
+    except OSError:
+        return False
+
+
+# posix_fadvise: agresivni read-ahead pri čitanju, a nakon kopiranja stranice se
+# izbacuju iz page cachea da backup ne istisne radni skup korisnika
+FADVISE_SUPPORTED = hasattr(os, 'posix_fadvise')
+
+
+def fadvise(fd: int, advice: int):
+    try:
+        os.posix_fadvise(fd, 0, 0, advice)
+    except OSError:
+        pass
+
+
+def fast_copy(src: str, dst: str, reflink: bool = False) -> bool:
+    """Kopira datoteku bez prolaska kroz Python buffer, čuva metapodatke kao shutil.copy2.
+    Vraća True ako je datoteka klonirana (reflink) umjesto kopirana."""
+    binary = getattr(os, 'O_BINARY', 0)
+    size = os.stat(src).st_size
+    cloned = False
+
+    # O_SEQUENTIAL je Windows ekvivalent fadvise SEQUENTIAL
+    src_fd = os.open(src, os.O_RDONLY | binary | getattr(os, 'O_SEQUENTIAL', 0))
+    try:
+        if FADVISE_SUPPORTED:
+            fadvise(src_fd, os.POSIX_FADV_SEQUENTIAL)
+        dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | binary, 0o666)
+        try:
+            cloned = reflink and clone_file(src_fd, dst_fd)
+            copied = cloned or _kernel_copy(src_fd, dst_fd, size)
+            # mmap samo ako se izvor nije promijenio od stat-a - inače shutil.copyfile
+            if not copied and _mmap_supported(size) and os.fstat(src_fd).st_size == size:
+                _mmap_copy(src_fd, dst_fd, size)
+                copied = True
+            if copied and FADVISE_SUPPORTED:
+                fadvise(dst_fd, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(dst_fd)
+        if FADVISE_SUPPORTED:
+            fadvise(src_fd, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(src_fd)
+
+    if not copied:
+        shutil.copyfile(src, dst)
+    shutil.copystat(src, dst)
+    return cloned
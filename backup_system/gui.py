@@ -5,21 +5,49 @@ Koristi tkinter za jednostavni UI
 
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
+from tkinter.scrolledtext import ScrolledText
+import functools
 import json
+import logging
 import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from logger import BackupLogger
-from integrity_checker import IntegrityChecker
+from integrity_checker import get_integrity_checker
 from backup_engine import BackupEngine
 from version_manager import VersionManager
 from disaster_recovery import DisasterRecoveryManager
-from scheduler import BackupScheduler
+from scheduler import SchedulerService
 from cloud_sync import CloudSync
 import shutil
 
 
+@functools.lru_cache(maxsize=1)
+def _config():
+    """config.json uz ovaj modul - ne ovisi o trenutnom radnom direktoriju, parsira se jednom"""
+    config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.json')
+    with open(config_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class _QueueHandler(logging.Handler):
+    """Prosljeđuje log zapise iz bilo kojeg threada u red koji GUI prazni na Tk threadu"""
+
+    def __init__(self, records):
+        super().__init__(logging.INFO)
+        self.records = records
+
+    def emit(self, record):
+        self.records.put(self.format(record))
+
+
 class BackupGUI:
     """Grafičko sučelje za sustav"""
 
+    LOG_LINES = 500
+
     def __init__(self, root):
         """Inicijalizacija GUI-ja"""
         self.root = root
@@ -27,9 +55,13 @@ class BackupGUI:
         self.root.geometry("900x700")
         self.root.configure(bg='#f0f0f0')
 
-        self.config = self._load_config()
+        self.config = _config()
         self.logger = BackupLogger(self.config['logging']['log_file'])
-        self.integrity_checker = IntegrityChecker('sha256', self.logger)
+        integrity_config = self.config.get('integrity_check', {})
+        self.integrity_checker = get_integrity_checker(
+            integrity_config.get('algorithm', 'sha256'),
+            self.logger
+        )
         self.backup_engine = BackupEngine(
             self.config['system_config']['backup_root'],
             self.logger,
@@ -46,21 +78,40 @@ class BackupGUI:
             self.integrity_checker
         )
 
-        self.scheduler = BackupScheduler(
-            backup_engine=self.backup_engine,
-            logger=self.logger
-        )
-        self.scheduler.start_scheduler()  # start scheduler u pozadini
+        # Zakazani backupi rade u zasebnom procesu s vlastitim engineom; proces
+        # nadživi GUI, a sljedeće pokretanje GUI-ja spaja se na njega
+        self.scheduler = SchedulerService(self.config)
+        try:
+            self.scheduler.start_scheduler()
+        except Exception as e:
+            self.logger.logger.error(f"Scheduler servis nije dostupan: {e}")
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
 
         self.cloud_sync = CloudSync(logger=self.logger)
 
+        # Dugotrajne operacije idu u pozadinu da Tk petlja ostane responzivna;
+        # jedan worker - engine i checker (progress/cancel) nisu thread-safe
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.action_buttons = []
+        # Brojke iz statusne trake - novi backup ih azurira bez ponovnog citanja povijesti
+        self.info = None
+
+        # Prekid hashiranja iz pozadinskih operacija; checker je zajednički pa se
+        # progress i prekid predaju svakom pozivu, ne postavljaju na checker
+        self.cancel_event = threading.Event()
+        # postotak iz pozadinskog threada; Tk widgete dira samo _poll na Tk threadu
+        self.progress_updates = queue.SimpleQueue()
+
         self._create_ui()
-        self._refresh_backup_list()
 
-    def _load_config(self):
-        """Učitava konfiguraciju"""
-        with open('config.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
+        # Log pane prati self.logger - handler samo puni red, Tk ga prazni
+        self.log_records = queue.SimpleQueue()
+        self.log_handler = _QueueHandler(self.log_records)
+        self.log_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        self.logger.logger.addHandler(self.log_handler)
+        self._drain_log()
+
+        self._refresh_backup_list()
 
     def _create_ui(self):
         """Kreira korisničko sučelje"""
@@ -74,6 +125,17 @@ class BackupGUI:
                          font=("Arial", 18, "bold"), bg='#2c3e50', fg='white')
         title.pack(pady=10)
 
+        # Status bar i log na dnu - pakiraju se prije sadrzaja da uvijek ostanu vidljivi
+        status_bar = ttk.Frame(self.root, relief=tk.SUNKEN)
+        status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+        self.status_var = tk.StringVar(value="Spremno")
+        self.info_var = tk.StringVar()
+        ttk.Label(status_bar, textvariable=self.info_var, anchor='e').pack(side=tk.RIGHT)
+        ttk.Label(status_bar, textvariable=self.status_var, anchor='w').pack(side=tk.LEFT, fill=tk.X,
+                                                                           expand=True)
+        self.log_text = ScrolledText(self.root, height=6, state=tk.DISABLED)
+        self.log_text.pack(side=tk.BOTTOM, fill=tk.X, padx=10)
+
         # Main content
         main_frame = ttk.Frame(self.root)
         main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -83,12 +145,12 @@ class BackupGUI:
         left_panel.pack(side=tk.LEFT, fill=tk.BOTH, expand=False, padx=(0, 10))
 
         # Backup tipke
-        tk.Button(left_panel, text="Full Backup", command=self.full_backup,
-                  bg='#2e3330', fg='white', width=15, height=2).pack(pady=5)
-        tk.Button(left_panel, text="Incremental Backup", command=self.incremental_backup,
-                  bg='#2e3330', fg='white', width=15, height=2).pack(pady=5)
-        tk.Button(left_panel, text="Differential Backup", command=self.differential_backup,
-                  bg='#2e3330', fg='white', width=15, height=2).pack(pady=5)
+        self._action_button(left_panel, "Full Backup", lambda: self._run_backup('full'),
+                            width=15, height=2)
+        self._action_button(left_panel, "Incremental Backup", lambda: self._run_backup('incremental'),
+                            width=15, height=2)
+        self._action_button(left_panel, "Differential Backup", lambda: self._run_backup('differential'),
+                            width=15, height=2)
 
         
 
@@ -109,23 +171,27 @@ class BackupGUI:
                   bg='#2e3330', fg='white', width=25).pack(pady=5)
         ttk.Separator(left_panel, orient='horizontal').pack(fill=tk.X, pady=10)
         # Restore
-        tk.Button(left_panel, text="Restore Backup", command=self.restore_backup,
-                  bg='#2e3330', fg='white', width=15, height=2).pack(pady=5)
+        self._action_button(left_panel, "Restore Backup", self.restore_backup, width=15, height=2)
+
+        # Provjera integriteta odabranog backupa
+        self._action_button(left_panel, "Quick Verify", lambda: self.verify_backup(False), width=15)
+        self._action_button(left_panel, "Deep Verify", lambda: self.verify_backup(True), width=15)
 
         ttk.Separator(left_panel, orient='horizontal').pack(fill=tk.X, pady=10)
 
         # Novi gumb za brisanje svih backup-a
-        tk.Button(left_panel, text="Delete All Backups", command=self.delete_all_backups_gui,
-                  bg='#2e3330', fg='white', width=20).pack(pady=5)
+        self._action_button(left_panel, "Delete All Backups", self.delete_all_backups_gui, width=20)
 
         ttk.Separator(left_panel, orient='horizontal').pack(fill=tk.X, pady=10)
 
-        tk.Button(left_panel, text="Upload All to Cloud", command=self.upload_all_to_cloud,
-                  bg='#2e3330', fg='white', width=25).pack(pady=5)
+        self._action_button(left_panel, "Upload All to Cloud", self.upload_all_to_cloud, width=25)
 
         tk.Button(left_panel, text="Refresh", command=self._refresh_backup_list,
                   bg='#2e3330', fg='white', width=15).pack(pady=5)
 
+        tk.Button(left_panel, text="Prekini", command=self.cancel_event.set,
+                  bg='#2e3330', fg='white', width=15).pack(pady=5)
+
         # Right panel - Backup lista
         right_panel = ttk.LabelFrame(main_frame, text="Dostupni Backupi", padding=10)
         right_panel.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
@@ -154,76 +220,118 @@ class BackupGUI:
         self.tree.heading('Timestamp', text='Timestamp', anchor=tk.CENTER)
 
         self.tree.pack(fill=tk.BOTH, expand=True)
+        self.tree.tag_configure('green', foreground='green')
+        self.tree.tag_configure('red', foreground='red')
+
+        self.progress = ttk.Progressbar(right_panel, mode='determinate', maximum=100)
+        self.progress.pack(fill=tk.X, pady=(5, 0))
+
+    def _action_button(self, parent, text, command, **options):
+        """Gumb akcije - onemogucen dok pozadinska operacija traje"""
+        button = tk.Button(parent, text=text, command=command, bg='#2e3330', fg='white', **options)
+        button.pack(pady=5)
+        self.action_buttons.append(button)
+
+    # ---------------- Pozadinski rad ----------------
+    def _poll(self, future, callback, *args):
+        """Ceka future bez blokiranja Tk petlje, callback se zove na Tk threadu"""
+        self._drain_progress()
+        if future.done():
+            callback(future, *args)
+        else:
+            self.root.after(150, self._poll, future, callback, *args)
 
-    # ---------------- Backup funkcije ----------------
-    def full_backup(self):
-        source = filedialog.askdirectory(title="Odaberi direktorij za backup")
-        if not source: return
-        try:
-            self.logger.logger.info(f"Pokretanje full backupa za: {source}")
-            success, metadata = self.backup_engine.full_backup(source)
-            if success:
-                messagebox.showinfo("Uspjeh",
-                                    f"Full backup završen!\n\n"
-                                    f"ID: {metadata['id']}\n"
-                                    f"Datoteke: {metadata['file_count']}\n"
-                                    f"Veličina: {metadata['size_bytes'] / 1024:.2f} KB\n"
-                                    f"Trajanje: {metadata['duration_seconds']:.2f}s")
-                self._refresh_backup_list()
-            else:
-                messagebox.showerror("Greška", f"Backup neuspjesan:\n{metadata.get('error')}")
-        except Exception as e:
-            messagebox.showerror("Greška", f"Greška pri backupu:\n{e}")
+    def _set_status(self, text):
+        self.status_var.set(text)
 
-    def incremental_backup(self):
-        source = filedialog.askdirectory(title="Odaberi direktorij za backup")
-        if not source: return
+    def _drain_log(self):
+        """Prebacuje nove log zapise u log pane; cuva samo zadnjih LOG_LINES redaka"""
+        lines = []
+        try:
+            while True:
+                lines.append(self.log_records.get_nowait())
+        except queue.Empty:
+            pass
+        if lines:
+            self.log_text.configure(state=tk.NORMAL)
+            self.log_text.insert(tk.END, '\n'.join(lines) + '\n')
+            self.log_text.delete('1.0', f'end-{self.LOG_LINES + 1}l')
+            self.log_text.see(tk.END)
+            self.log_text.configure(state=tk.DISABLED)
+        self.root.after(200, self._drain_log)
+
+    def _start_task(self):
+        """Resetira progress i prekid prije nove operacije"""
+        self.cancel_event.clear()
+        self._drain_progress()  # zaostatak prethodne operacije
+        self.progress.configure(value=0)
+        self._set_busy(True)
+
+    def _set_busy(self, busy):
+        """Dok operacija traje ne moze se pokrenuti druga"""
+        state = tk.DISABLED if busy else tk.NORMAL
+        for button in self.action_buttons:
+            button.configure(state=state)
+
+    def _report_progress(self, done, total):
+        """Zove se iz pozadinskog threada - samo puni red, Tk se ne poziva"""
+        if total:
+            self.progress_updates.put(done * 100 / total)
+
+    def _drain_progress(self):
+        """Na Tk threadu: prikazuje samo zadnju vrijednost iz reda"""
+        value = None
+        try:
+            while True:
+                value = self.progress_updates.get_nowait()
+        except queue.Empty:
+            pass
+        if value is not None:
+            self.progress.configure(value=value)
+
+    def _on_backup_done(self, future, kind):
+        self._set_busy(False)
         try:
-            self.logger.logger.info(f"Pokretanje incremental backupa za: {source}")
-            success, metadata = self.backup_engine.incremental_backup(source)
+            success, metadata = future.result()
+            # I neuspjeli backup ide u povijest, pa i u listu
+            self._insert_row(metadata)
             if success:
-                messagebox.showinfo("Uspjeh",
-                                    f"Incremental backup završen!\n\n"
-                                    f"ID: {metadata['id']}\n"
-                                    f"Datoteke: {metadata['file_count']}\n"
-                                    f"Veličina: {metadata['size_bytes'] / 1024:.2f} KB\n"
-                                    f"Trajanje: {metadata['duration_seconds']:.2f}s")
-                self._refresh_backup_list()
+                self._set_status(f"{kind.capitalize()} backup {metadata['id']} završen: "
+                                 f"{metadata['file_count']} datoteka, "
+                                 f"{metadata['size_bytes'] / 1024:.2f} KB, "
+                                 f"{metadata['duration_seconds']:.2f}s")
             else:
-                messagebox.showerror("Greška", f"Backup neuspjesan:\n{metadata.get('error')}")
+                self._set_status(f"Backup neuspješan: {metadata.get('error')}")
         except Exception as e:
-            messagebox.showerror("Greška", f"Greška pri backupu:\n{e}")
+            self._set_status(f"Greška pri backupu: {e}")
 
-    def differential_backup(self):
+    # ---------------- Backup funkcije ----------------
+    def _run_backup(self, kind):
+        """kind: 'full', 'incremental' ili 'differential'"""
         source = filedialog.askdirectory(title="Odaberi direktorij za backup")
         if not source: return
-        try:
-            self.logger.logger.info(f"Pokretanje differential backupa za: {source}")
-            success, metadata = self.backup_engine.differential_backup(source)
-            if success:
-                messagebox.showinfo("Uspjeh",
-                                    f"Differential backup završen!\n\n"
-                                    f"ID: {metadata['id']}\n"
-                                    f"Datoteke: {metadata['file_count']}\n"
-                                    f"Veličina: {metadata['size_bytes'] / 1024:.2f} KB\n"
-                                    f"Trajanje: {metadata['duration_seconds']:.2f}s")
-                self._refresh_backup_list()
-            else:
-                messagebox.showerror("Greška", f"Backup neuspjesan:\n{metadata.get('error')}")
-        except Exception as e:
-            messagebox.showerror("Greška", f"Greška pri backupu:\n{e}")
+        method = {
+            'full': self.backup_engine.full_backup,
+            'incremental': self.backup_engine.incremental_backup,
+            'differential': self.backup_engine.differential_backup
+        }[kind]
+        self.logger.logger.info(f"Pokretanje {kind} backupa za: {source}")
+        self._start_task()
+        future = self.executor.submit(method, source, progress_cb=self._report_progress,
+                                      cancel_event=self.cancel_event)
+        self._poll(future, self._on_backup_done, kind)
 
     def restore_backup(self):
         selection = self.tree.selection()
         if not selection:
-            messagebox.showwarning("Upozorenje", "Odaberi backup za restauraciju!")
+            self._set_status("Odaberi backup za restauraciju!")
             return
         item = selection[0]
         backup_id = self.tree.item(item)['values'][0]
 
         dest = filedialog.askdirectory(title="Odaberi direktorij gdje vratiti podatke")
         if not dest:
-            messagebox.showinfo("Otkazano", "Restauracija otkazana")
+            self._set_status("Restauracija otkazana")
             return
 
         if os.path.exists(dest) and os.listdir(dest):
@@ -234,21 +342,71 @@ class BackupGUI:
             if not response:
                 return
 
+        self.logger.logger.info(f"Pokretanje restauracije: {backup_id}")
+        self._start_task()
+        future = self.executor.submit(self._restore, backup_id, dest)
+        self._poll(future, self._on_restore_done, dest)
+
+    def _restore(self, backup_id, dest):
+        """Izvodi se u pozadinskom threadu"""
+        backup_meta = next((b for b in self.disaster_recovery.list_available_backups()
+                            if b['id'] == backup_id), None)
+        return self.disaster_recovery.restore_from_backup(backup_id, dest,
+                                                          backup_meta=backup_meta,
+                                                          progress_cb=self._report_progress,
+                                                          cancel_event=self.cancel_event)
+
+    def _on_restore_done(self, future, dest):
+        self._set_busy(False)
         try:
-            self.logger.logger.info(f"Pokretanje restauracije: {backup_id}")
-            success, metadata = self.disaster_recovery.restore_from_backup(backup_id, dest)
+            success, metadata = future.result()
             if success:
-                messagebox.showinfo("Uspjeh",
-                                    f"Restauracija završena!\n\n"
-                                    f"Recovery ID: {metadata['recovery_id']}\n"
-                                    f"Datoteke: {metadata['file_count']}\n"
-                                    f"Trajanje: {metadata['duration_seconds']:.2f}s\n"
-                                    f"Lokacija: {dest}")
+                self._set_status(f"Restauracija {metadata['recovery_id']} završena: "
+                                 f"{metadata['file_count']} datoteka u "
+                                 f"{metadata['duration_seconds']:.2f}s → {dest}")
             else:
-                messagebox.showerror("Greška",
-                                     f"Restauracija neuspješna:\n{metadata.get('error')}")
+                self._set_status(f"Restauracija neuspješna: {metadata.get('error')}")
         except Exception as e:
-            messagebox.showerror("Greška", f"Greška pri restauraciji:\n{e}")
+            self._set_status(f"Greška pri restauraciji: {e}")
+
+    def verify_backup(self, deep):
+        """Quick: samo velicina i mtime, deep: ponovni hash svih datoteka"""
+        selection = self.tree.selection()
+        if not selection:
+            self._set_status("Odaberi backup za provjeru!")
+            return
+        backup_id = self.tree.item(selection[0])['values'][0]
+
+        self.logger.logger.info(f"Provjera integriteta ({'deep' if deep else 'quick'}): {backup_id}")
+        self._start_task()
+        future = self.executor.submit(self._verify, backup_id, deep)
+        self._poll(future, self._on_verify_done, backup_id)
+
+    def _verify(self, backup_id, deep):
+        """Izvodi se u pozadinskom threadu"""
+        backup_meta = next((b for b in self.disaster_recovery.list_available_backups()
+                            if b['id'] == backup_id), None)
+        if backup_meta is None:
+            raise Exception(f"Backup {backup_id} nije pronadjen")
+        manifest_path = os.path.join(backup_meta['path'], 'MANIFEST.json')
+        if not os.path.exists(manifest_path):
+            raise Exception(f"Backup {backup_id} nema MANIFEST.json")
+        return self.integrity_checker.verify_backup_integrity(backup_meta['path'], manifest_path,
+                                                              progress_cb=self._report_progress,
+                                                              cancel_event=self.cancel_event,
+                                                              deep=deep)
+
+    def _on_verify_done(self, future, backup_id):
+        self._set_busy(False)
+        try:
+            valid, results = future.result()
+            self._set_status(f"Integritet {backup_id}: {'OK' if valid else 'PROBLEMI'} | "
+                             f"provjereno {results['verified_files']}/{results['total_files']}, "
+                             f"oštećeno {len(results['corrupted_files'])}, "
+                             f"nedostaje {len(results['missing_files'])}, "
+                             f"nečitljivo {len(results['errors'])}")
+        except Exception as e:
+            self._set_status(f"Greška pri provjeri integriteta: {e}")
 
     def cleanup_backups(self):
         """Čišćenje prema retention policy"""
@@ -256,16 +414,13 @@ class BackupGUI:
             if messagebox.askyesno("Potvrda", "Obrisati stare backupe prema retention politici?"):
                 self.logger.logger.info("Pokretanje čišćenja starih backupa")
                 results = self.version_manager.apply_retention_policy()
-                messagebox.showinfo("Uspjeh",
-                                    f"Čišćenje završeno!\n\n"
-                                    f"Obrisani backupi:\n"
-                                    f"  - Full: {results['full_backups_deleted']}\n"
-                                    f"  - Incremental: {results['incremental_backups_deleted']}\n"
-                                    f"  - Differential: {results['differential_backups_deleted']}\n"
-                                    f"Oslobođeno prostora: {results['total_space_freed_bytes'] / (1024*1024):.2f} MB")
                 self._refresh_backup_list()
+                self._set_status(f"Čišćenje završeno: obrisano full {results['full_backups_deleted']}, "
+                                 f"incremental {results['incremental_backups_deleted']}, "
+                                 f"differential {results['differential_backups_deleted']}; "
+                                 f"oslobođeno {results['total_space_freed_bytes'] / (1024*1024):.2f} MB")
         except Exception as e:
-            messagebox.showerror("Greška", f"Greška pri čišćenju:\n{e}")
+            self._set_status(f"Greška pri čišćenju: {e}")
 
     def delete_all_backups_gui(self):
         """Obriši cijelu backups mapu"""
@@ -277,10 +432,8 @@ class BackupGUI:
 
         success, msg = self.backup_engine.delete_all_backups()
         if success:
-            messagebox.showinfo("Uspjeh", msg)
             self._refresh_backup_list()  # odmah osvježi TreeView
-        else:
-            messagebox.showerror("Greška", msg)
+        self._set_status(msg)
 
     # ---------------- Cloud funkcije ----------------
     def upload_all_to_cloud(self):
@@ -293,45 +446,89 @@ class BackupGUI:
             if not confirm:
                 return
 
-            results = self.cloud_sync.sync_all_backups()
-            messagebox.showinfo("Cloud Sync",
-                                f"Uspješno: {results['successful_uploads']}\n"
-                                f"Neuspješno: {results['failed_uploads']}\n"
-                                f"Ukupno datoteka: {results['total_files']}")
+            self._set_busy(True)
+            future = self.executor.submit(self.cloud_sync.sync_all_backups)
+            self._poll(future, self._on_upload_done)
+        except Exception as e:
+            self._set_status(f"Greška pri uploadu na cloud: {e}")
+
+    def _on_upload_done(self, future):
+        self._set_busy(False)
+        try:
+            results = future.result()
+            self._set_status(f"Cloud sync: uspješno {results['successful_uploads']}, "
+                             f"neuspješno {results['failed_uploads']}, "
+                             f"ukupno {results['total_files']} datoteka")
         except Exception as e:
-            messagebox.showerror("Greška", f"Greška pri uploadu na cloud:\n{e}")
+            self._set_status(f"Greška pri uploadu na cloud: {e}")
 
     # ---------------- Lista backupa ----------------
     def _refresh_backup_list(self):
         """Osvježi listu backupa"""
-        try:
-            for item in self.tree.get_children():
-                self.tree.delete(item)
-
-            summary = self.backup_engine.get_backup_summary()
-
-            for backup in summary['backups']:
-                ts_str = backup['timestamp'].strftime('%Y-%m-%d %H:%M:%S') if backup.get('timestamp') else ''
-                status_color = 'green' if backup['status'] == 'completed' else 'red'
-
-                self.tree.insert('', 'end',
-                                 values=(backup['id'], backup['type'], backup['files'],
-                                         f"{backup['size_mb']:.2f}", backup['status'], ts_str),
-                                 tags=(status_color,))
+        future = self.executor.submit(self._load_backup_list)
+        self._poll(future, self._on_backup_list_loaded)
+
+    def _load_backup_list(self):
+        """Izvodi se u pozadinskom threadu"""
+        return self.backup_engine.get_backup_summary(), self.disaster_recovery.calculate_rpo_rto()
+
+    def _insert_row(self, metadata):
+        """Dodaje jedan novi backup na vrh liste bez ponovnog citanja povijesti"""
+        ts = metadata.get('timestamp')
+        ts_str = ts.strftime('%Y-%m-%d %H:%M:%S') if ts else ''
+        status_color = 'green' if metadata.get('status') == 'completed' else 'red'
+        self.tree.insert('', 0,
+                         values=(metadata['id'], metadata['type'], metadata.get('file_count', 0),
+                                 f"{metadata.get('size_bytes', 0) / (1024*1024):.2f}",
+                                 metadata.get('status', 'unknown'), ts_str),
+                         tags=(status_color,))
+
+        if self.info is not None:
+            self.info['total_backups'] += 1
+            self.info['total_size_bytes'] += metadata.get('size_bytes', 0)
+            if metadata.get('status') == 'completed' and ts:
+                self.info['rpo_minutes'] = max(0.0, (datetime.now() - ts).total_seconds() / 60.0)
+            self._show_info()
+
+    def _show_info(self):
+        self.info_var.set(
+            f"Ukupno backupa: {self.info['total_backups']} | "
+            f"Ukupna veličina: {self.info['total_size_bytes'] / (1024*1024):.2f} MB | "
+            f"RTO: {self.info['rto_minutes']:.1f} min | "
+            f"RPO: {self.info['rpo_minutes']:.1f} min"
+        )
 
-            self.tree.tag_configure('green', foreground='green')
-            self.tree.tag_configure('red', foreground='red')
+    def _on_backup_list_loaded(self, future):
+        try:
+            summary, metrics = future.result()
+
+            rows = [
+                ((backup['id'], backup['type'], backup['files'], f"{backup['size_mb']:.2f}",
+                  backup['status'],
+                  backup['timestamp'].strftime('%Y-%m-%d %H:%M:%S') if backup.get('timestamp') else ''),
+                 'green' if backup['status'] == 'completed' else 'red')
+                for backup in summary['backups']
+            ]
+
+            # Odspojen Treeview se ne iscrtava nakon svakog inserta
+            self.tree.pack_forget()
+            children = self.tree.get_children()
+            if children:
+                self.tree.delete(*children)
+            for values, status_color in rows:
+                self.tree.insert('', 'end', values=values, tags=(status_color,))
+            self.tree.pack(fill=tk.BOTH, expand=True, before=self.progress)
 
             # Osvježi info
-            metrics = self.disaster_recovery.calculate_rpo_rto()
-            info_text = (
-                f"Ukupno backupa: {summary['total_backups']} | "
-                f"Ukupna veličina: {summary['total_size_bytes'] / (1024*1024):.2f} MB | "
-                f"RTO: {metrics['rto_minutes']:.1f} min | "
-                f"RPO: {metrics['rpo_minutes']:.1f} min"
-            )
+            self.info = {
+                'total_backups': summary['total_backups'],
+                'total_size_bytes': summary['total_size_bytes'],
+                'rto_minutes': metrics['rto_minutes'],
+                'rpo_minutes': metrics['rpo_minutes']
+            }
+            self._show_info()
         except Exception as e:
-            messagebox.showerror("Greška", f"Greška pri osvježavanju:\n{e}")
+            self._set_status(f"Greška pri osvježavanju: {e}")
 
     # ---------------- Scheduler popup ----------------
     def schedule_backup_gui(self):
@@ -360,7 +557,7 @@ class BackupGUI:
                 hour, minute = map(int, time_str.split(":"))
                 self.scheduler.schedule_backup(source_dir=source, hour=hour, minute=minute)
                 self.logger.logger.info(f"Backup za {source} zakazan u {hour:02d}:{minute:02d}")
-                messagebox.showinfo("Scheduler", f"Backup za {source} zakazan u {hour:02d}:{minute:02d}")
+                self._set_status(f"Backup za {source} zakazan u {hour:02d}:{minute:02d}")
                 popup.destroy()
             except Exception as e:
                 messagebox.showerror("Greška", f"Neispravno vrijeme ili problem sa zakazivanjem:\n{e}")
@@ -386,7 +583,7 @@ class BackupGUI:
 
             messagebox.showinfo("Scheduler Status", text)
         except Exception as e:
-            messagebox.showerror("Greška", f"Greška pri dohvaćanju statusa schedula:\n{e}")
+            self._set_status(f"Greška pri dohvaćanju statusa schedula: {e}")
 
     def cancel_all_scheduled_backups(self):
         """Otkazuje sve zakazane backup-e"""
@@ -398,9 +595,18 @@ class BackupGUI:
 
         try:
             count = self.scheduler.cancel_all_backups()
-            messagebox.showinfo("Scheduler", f"Svi zakazani backup-i otkazani ({count} jobova).")
+            self._set_status(f"Svi zakazani backup-i otkazani ({count} jobova).")
+        except Exception as e:
+            self._set_status(f"Greška pri otkazivanju schedula: {e}")
+
+    def _on_close(self):
+        """Servis ostaje raditi samo ako ima zakazanih backupa"""
+        try:
+            if not self.scheduler.get_scheduler_status()['scheduled_jobs']:
+                self.scheduler.stop_scheduler()
         except Exception as e:
-            messagebox.showerror("Greška", f"Greška pri otkazivanju schedula:\n{e}")
+            self.logger.logger.warning(f"Scheduler servis: {e}")
+        self.root.destroy()
 
 
 def main():
@@ -2,18 +2,248 @@
 Provjera integriteta podataka
 """
 
+import functools
 import hashlib
 import os
 import json
+import mmap
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from typing import Dict, Tuple
 from datetime import datetime
 
+from file_io import FADVISE_SUPPORTED, fadvise
+
+# Ispod ovog broja datoteka pokretanje procesa kosta vise nego sto donosi
+PARALLEL_HASH_MIN_FILES = 64
+
+# Veliki blokovi - svaki poziv u OpenSSL obradi dovoljno podataka
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Od ove velicine datoteka se mapira u memoriju umjesto citanja u buffer
+MMAP_HASH_MIN_SIZE = 64 * 1024 * 1024
+
+# Koliko blokova/zapisa reader thread smije procitati unaprijed kod provjere integriteta
+PREFETCH_DEPTH = 4
+
+_PREFETCH_END = object()
+
+
+class _ReadError:
+    """Datoteku nije moguce procitati - reader je salje umjesto stata ili bloka"""
+
+    def __init__(self, error: OSError):
+        self.error = error
+
+# Zajednicki pool procesa za hashiranje - kreira se pri prvoj upotrebi
+_pool = None
+_pool_lock = threading.Lock()
+
+# Buffer za citanje po threadu (i po procesu u poolu) - ne alocira se za svaku datoteku
+_buffers = threading.local()
+
+
+def _read_buffer(chunk_size: int) -> bytearray:
+    buf = getattr(_buffers, 'buf', None)
+    if buf is None or len(buf) != chunk_size:
+        buf = _buffers.buf = bytearray(chunk_size)
+    return buf
+
+
+def _update_from_mmap(hash_obj, f, chunk_size: int, progress_cb, cancel_event):
+    """Hash izravno iz page cachea - bez kopiranja u korisnicki buffer"""
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = len(mm)
+        view = memoryview(mm)
+        try:
+            # Slice memoryviewa ne kopira, a omogucuje progress i prekid
+            for offset in range(0, size, chunk_size):
+                if cancel_event is not None and cancel_event.is_set():
+                    raise InterruptedError("Hashiranje prekinuto")
+                hash_obj.update(view[offset:offset + chunk_size])
+                if progress_cb:
+                    progress_cb(min(offset + chunk_size, size), size)
+        finally:
+            view.release()
+
+
+def _update_from_file(hash_obj, f, chunk_size: int = HASH_CHUNK_SIZE,
+                      progress_cb=None, cancel_event=None, total: int = None):
+    """Cita datoteku u jedan unaprijed alocirani buffer i puni hash; total je velicina datoteke"""
+    if total is not None and total < chunk_size:
+        # Mala datoteka: jedan read() i jedan update, bez petlje, buffera i fadvise poziva
+        if cancel_event is not None and cancel_event.is_set():
+            raise InterruptedError("Hashiranje prekinuto")
+        data = f.read()
+        hash_obj.update(data)
+        if progress_cb:
+            progress_cb(len(data), total)
+        return
+
+    # Sekvencijalno citanje: agresivniji readahead, a stranice se nakon hasha
+    # izbacuju iz page cachea da ne istiskuju podatke koji se stvarno koriste
+    if FADVISE_SUPPORTED:
+        fadvise(f.fileno(), os.POSIX_FADV_SEQUENTIAL)
+    try:
+        if total is not None and total >= MMAP_HASH_MIN_SIZE:
+            _update_from_mmap(hash_obj, f, chunk_size, progress_cb, cancel_event)
+        else:
+            _update_from_buffer(hash_obj, f, chunk_size, progress_cb, cancel_event, total)
+    finally:
+        if FADVISE_SUPPORTED:
+            fadvise(f.fileno(), os.POSIX_FADV_DONTNEED)
+
+
+def _update_from_buffer(hash_obj, f, chunk_size: int, progress_cb, cancel_event, total):
+    buf = _read_buffer(chunk_size)
+    view = memoryview(buf)
+    done = 0
+    while True:
+        if cancel_event is not None and cancel_event.is_set():
+            raise InterruptedError("Hashiranje prekinuto")
+        n = f.readinto(buf)
+        if not n:
+            break
+        hash_obj.update(view[:n])
+        if progress_cb:
+            done += n
+            progress_cb(done, total)
+
+
+# Manifest je NDJSON: zaglavlje u prvom redu, zatim jedna datoteka po redu
+MANIFEST_FORMAT = 'ndjson-v1'
+
+
+def _manifest_header(line: bytes):
+    """Zaglavlje NDJSON manifesta ili None za stari format (jedan JSON dokument)"""
+    try:
+        header = json.loads(line)
+    except ValueError:
+        return None
+    if isinstance(header, dict) and header.get('format') == MANIFEST_FORMAT:
+        return header
+    return None
+
+
+def iter_manifest(manifest_path: str):
+    """(relativna putanja, info) red po red - cijeli manifest nikad nije u memoriji"""
+    with open(manifest_path, 'rb') as f:
+        if _manifest_header(f.readline()) is None:
+            f.seek(0)
+            yield from json.loads(f.read())['files'].items()
+            return
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                yield entry.pop('path'), entry
+
+
+def load_manifest(manifest_path: str, hashes_only: bool = False) -> Dict:
+    """Cijeli manifest kao {'algorithm', 'created', 'files': {...}}, za oba formata
+
+    hashes_only: 'files' je {putanja: hash} - bez dict-a po datoteci, za velike manifeste
+    """
+    with open(manifest_path, 'rb') as f:
+        manifest = _manifest_header(f.readline())
+        if manifest is None:
+            f.seek(0)
+            manifest = json.loads(f.read())
+            if hashes_only:
+                manifest['files'] = {path: info['hash'] for path, info in manifest['files'].items()}
+            return manifest
+        files = manifest['files'] = {}
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                path = entry.pop('path')
+                files[path] = entry['hash'] if hashes_only else entry
+        return manifest
+
+
+def _scan_tree(path: str):
+    """Redoslijed kao os.walk: datoteke direktorija pa poddirektoriji, bez stat poziva"""
+    files, dirs = [], []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir():
+                    # os.walk ne ulazi u symlinkane direktorije niti ih vraca kao datoteke
+                    if not entry.is_symlink():
+                        dirs.append(entry.path)
+                else:
+                    files.append(entry)
+    except OSError:
+        return
+
+    yield files
+    for directory in dirs:
+        yield from _scan_tree(directory)
+
+
+def _hash_pool() -> ProcessPoolExecutor:
+    """Jedan pool za sve pozive. Spawn umjesto forka: fork procesa s pokrenutim threadovima
+    (log listener, GUI executor, scheduler) moze ostaviti dijete zakljucano na tudjem locku"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=os.cpu_count(),
+                                        mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _discard_hash_pool():
+    """Pool s mrtvim procesom vise ne prima poslove - sljedeci poziv kreira novi"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _hash_one(item: Tuple[str, str, str]) -> Tuple[str, str, int, float]:
+    """Hash jedne datoteke u zasebnom procesu - mora biti na razini modula zbog picklea"""
+    file_path, relative_path, algorithm = item
+    hash_obj = hashlib.new(algorithm)
+
+    with open(file_path, 'rb') as f:
+        st = os.fstat(f.fileno())
+        _update_from_file(hash_obj, f, total=st.st_size)
+
+    return relative_path, hash_obj.hexdigest(), st.st_size, st.st_mtime
+
+
+def hash_file(file_path: str, algorithm: str = 'sha256') -> str:
+    """Hex hash jedne datoteke - bez kesa, uvijek cita sadrzaj"""
+    hash_obj = hashlib.new(algorithm)
+
+    with open(file_path, 'rb') as f:
+        _update_from_file(hash_obj, f, total=os.fstat(f.fileno()).st_size)
+
+    return hash_obj.hexdigest()
+
+
+def _digest_one(item: Tuple[str, str]) -> bytes:
+    """Sirovi digest datoteke - za kombinirani hash nije potreban hex zapis"""
+    file_path, algorithm = item
+    hash_obj = hashlib.new(algorithm)
+
+    with open(file_path, 'rb') as f:
+        _update_from_file(hash_obj, f, total=os.fstat(f.fileno()).st_size)
+
+    return hash_obj.digest()
+
+
 class IntegrityChecker:
     ALGORITHMS = {
         'md5': hashlib.md5,
         'sha1': hashlib.sha1,
         'sha256': hashlib.sha256,
-        'sha512': hashlib.sha512
+        'sha512': hashlib.sha512,
+        # BLAKE2b je u hashlibu, vektoriziran i brzi od SHA-256 na CPU-ima bez SHA-NI
+        'blake2b': hashlib.blake2b
     }
     
     def __init__(self, algorithm: str = 'sha256', logger=None):
@@ -24,16 +254,15 @@ class IntegrityChecker:
         self.hash_func = self.ALGORITHMS[algorithm]
         self.logger = logger
     
-    def calculate_file_hash(self, file_path: str, chunk_size: int = 8192) -> str:
+    def calculate_file_hash(self, file_path: str, chunk_size: int = HASH_CHUNK_SIZE,
+                            progress_cb=None, cancel_event=None) -> str:
+        """progress_cb(bytes_done, bytes_total); postavljen cancel_event prekida s InterruptedError"""
         hash_obj = self.hash_func()
         
         try:
             with open(file_path, 'rb') as f:
-                while True:
-                    chunk = f.read(chunk_size)
-                    if not chunk:
-                        break
-                    hash_obj.update(chunk)
+                st = os.fstat(f.fileno())
+                _update_from_file(hash_obj, f, chunk_size, progress_cb, cancel_event, st.st_size)
             
             return hash_obj.hexdigest()
         except Exception as e:
@@ -41,64 +270,122 @@ class IntegrityChecker:
                 self.logger.logger.error(f"Greska pri izracunu hasha za {file_path}: {e}")
             raise
     
-    def create_backup_manifest(self, backup_dir: str, manifest_path: str) -> Dict:
+    def create_backup_manifest(self, backup_dir: str, manifest_path: str,
+                               progress_cb=None, cancel_event=None) -> Dict:
+        """Zapisuje NDJSON manifest dok hashevi stizu; vraca zaglavlje s brojem datoteka.
+        progress_cb(files_done, files_total) se zove najvise ~100 puta"""
         manifest = {
             'algorithm': self.algorithm,
             'created': datetime.now().isoformat(),
-            'files': {}
+            'format': MANIFEST_FORMAT
         }
+        temp_path = manifest_path + '.tmp'
         
         try:
-            for root, dirs, files in os.walk(backup_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    relative_path = os.path.relpath(file_path, backup_dir)
-                    
-                    file_hash = self.calculate_file_hash(file_path)
-                    manifest['files'][relative_path] = {
-                        'hash': file_hash,
-                        'size': os.path.getsize(file_path),
-                        'modified': os.path.getmtime(file_path)
-                    }
-            
-            with open(manifest_path, 'w', encoding='utf-8') as f:
-                json.dump(manifest, f, indent=2)
+            prefix_len = len(os.path.join(backup_dir, ''))
+            algorithm = self.algorithm
+            paths = [(entry.path, entry.path[prefix_len:], algorithm)
+                     for files in _scan_tree(backup_dir) for entry in files]
+
+            parallel = len(paths) >= PARALLEL_HASH_MIN_FILES
+            if parallel:
+                results = _hash_pool().map(_hash_one, paths, chunksize=16)
+            else:
+                results = map(_hash_one, paths)
+
+            total = len(paths)
+            step = max(1, total // 100)
+            dumps = json.dumps
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    write = f.write
+                    write(dumps(manifest) + '\n')
+                    for done, (relative_path, file_hash, size, mtime) in enumerate(results, 1):
+                        write(dumps({'path': relative_path, 'hash': file_hash,
+                                     'size': size, 'modified': mtime}) + '\n')
+                        if cancel_event is not None and cancel_event.is_set():
+                            raise InterruptedError("Kreiranje manifesta prekinuto")
+                        if progress_cb and (done % step == 0 or done == total):
+                            progress_cb(done, total)
+            except BrokenProcessPool:
+                _discard_hash_pool()
+                raise
+            finally:
+                if parallel:
+                    # pool je zajednicki - otkazuju se samo preostali poslovi ovog manifesta
+                    results.close()
+
+            os.replace(temp_path, manifest_path)
+            manifest['file_count'] = total
             
             if self.logger:
-                self.logger.logger.info(f"Manifest kreiran: {len(manifest['files'])} datoteka")
+                self.logger.logger.info(f"Manifest kreiran: {total} datoteka")
             
             return manifest
         
         except Exception as e:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
             if self.logger:
                 self.logger.logger.error(f"Greska pri kreiranju manifesta: {e}")
             raise
     
-    def verify_backup_integrity(self, backup_dir: str, manifest_path: str) -> Tuple[bool, Dict]:
+    def verify_backup_integrity(self, backup_dir: str, manifest_path: str = None,
+                                manifest: Dict = None, progress_cb=None,
+                                cancel_event=None, deep: bool = True) -> Tuple[bool, Dict]:
+        """manifest: već parsiran MANIFEST.json - tada se manifest_path ne čita;
+        progress_cb(files_done, files_total);
+        deep=False: hash se racuna samo ako se velicina ili mtime razlikuju od manifesta"""
         results = {
             'valid': True,
+            'deep': deep,
             'total_files': 0,
             'verified_files': 0,
             'corrupted_files': [],
             'missing_files': [],
+            'errors': [],
             'timestamp': datetime.now().isoformat()
         }
         
         try:
-            with open(manifest_path, 'r', encoding='utf-8') as f:
-                manifest = json.load(f)
+            if manifest is not None:
+                entries = manifest['files'].items()
+            else:
+                entries = iter_manifest(manifest_path)
+                if progress_cb:
+                    # za postotak je potreban ukupan broj unaprijed
+                    entries = list(entries)
             
-            results['total_files'] = len(manifest['files'])
+            total = len(entries) if progress_cb else 0
+            step = max(1, total // 100)
             
-            for file_path, file_info in manifest['files'].items():
-                full_path = os.path.join(backup_dir, file_path)
+            pipeline = self._prefetch_entries(entries, backup_dir, deep)
+            for done, (file_path, file_info, full_path, st, current_hash, chunks) in enumerate(pipeline, 1):
+                results['total_files'] = done
+                if progress_cb and (done % step == 0 or done == total):
+                    progress_cb(done, total)
                 
-                if not os.path.exists(full_path):
+                if st is None:
                     results['missing_files'].append(file_path)
                     results['valid'] = False
                     continue
+                if isinstance(st, _ReadError):
+                    results['errors'].append(f"Greska pri citanju {file_path}: {st.error}")
+                    results['valid'] = False
+                    continue
                 
-                current_hash = self.calculate_file_hash(full_path)
+                if current_hash is None:
+                    hash_obj = self.hash_func()
+                    try:
+                        for chunk in chunks:
+                            if cancel_event is not None and cancel_event.is_set():
+                                raise InterruptedError("Hashiranje prekinuto")
+                            hash_obj.update(chunk)
+                    except OSError as e:
+                        results['errors'].append(f"Greska pri citanju {file_path}: {e}")
+                        results['valid'] = False
+                        continue
+                    current_hash = hash_obj.hexdigest()
                 expected_hash = file_info['hash']
                 
                 if current_hash != expected_hash:
@@ -125,6 +412,99 @@ class IntegrityChecker:
             results['valid'] = False
             return False, results
     
+    def _prefetch_entries(self, entries, backup_dir: str, deep: bool):
+        """Reader thread radi stat i cita sljedece datoteke dok se trenutna hashira.
+        Daje (putanja, info, puna putanja, stat / None / _ReadError, poznati hash ili None, blokovi).
+        Greska citanja datoteke ne zaustavlja reader - blokovi te datoteke zavrsavaju s OSError."""
+        items = queue.Queue(maxsize=PREFETCH_DEPTH)
+        stop = threading.Event()
+        
+        def put(item) -> bool:
+            # Ne blokira zauvijek ako je potrosac odustao
+            while not stop.is_set():
+                try:
+                    items.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+        
+        backup_prefix = os.path.join(backup_dir, '')
+        
+        def reader():
+            try:
+                for file_path, file_info in entries:
+                    full_path = backup_prefix + file_path
+                    try:
+                        st = os.stat(full_path)
+                    except FileNotFoundError:
+                        if not put((file_path, file_info, full_path, None, None)):
+                            return
+                        continue
+                    except OSError as e:
+                        if not put((file_path, file_info, full_path, _ReadError(e), None)):
+                            return
+                        continue
+                    
+                    known_hash = None
+                    if (not deep and st.st_size == file_info['size']
+                            and abs(st.st_mtime - file_info['modified']) < 1):
+                        known_hash = file_info['hash']
+                    if not put((file_path, file_info, full_path, st, known_hash)):
+                        return
+                    if known_hash is not None:
+                        continue
+                    
+                    try:
+                        with open(full_path, 'rb') as f:
+                            if FADVISE_SUPPORTED:
+                                fadvise(f.fileno(), os.POSIX_FADV_SEQUENTIAL)
+                            while True:
+                                chunk = f.read(HASH_CHUNK_SIZE)
+                                # prazan blok oznacava kraj datoteke
+                                if not put(chunk):
+                                    return
+                                if not chunk:
+                                    break
+                            if FADVISE_SUPPORTED:
+                                fadvise(f.fileno(), os.POSIX_FADV_DONTNEED)
+                    except OSError as e:
+                        # zavrsava blokove ove datoteke, sljedeca se cita normalno
+                        if not put(_ReadError(e)):
+                            return
+            except BaseException as e:
+                put(e)
+            finally:
+                # potrosac uvijek dobije kraj, i kad reader odustane zbog greske
+                put(_PREFETCH_END)
+        
+        def take():
+            item = items.get()
+            if isinstance(item, BaseException):
+                raise item
+            return item
+        
+        def chunks():
+            while True:
+                chunk = take()
+                if isinstance(chunk, _ReadError):
+                    raise chunk.error
+                if not chunk:
+                    return
+                yield chunk
+        
+        thread = threading.Thread(target=reader, daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = take()
+                if item is _PREFETCH_END:
+                    return
+                yield item + (chunks(),)
+        finally:
+            stop.set()
+            thread.join()
+    
     def verify_file_during_restore(self, file_path: str, expected_hash: str) -> bool:
         try:
             actual_hash = self.calculate_file_hash(file_path)
@@ -146,14 +526,34 @@ class IntegrityChecker:
         combined_hash = self.hash_func()
         
         try:
-            for root, dirs, files in os.walk(directory):
-                for file in sorted(files):
-                    file_path = os.path.join(root, file)
-                    file_hash = self.calculate_file_hash(file_path)
-                    combined_hash.update(file_hash.encode())
+            algorithm = self.algorithm
+            prefix_len = len(os.path.join(directory, ''))
+            # Sortirano po relativnoj putanji - rezultat ne ovisi o redoslijedu obilaska
+            entries = sorted((entry.path[prefix_len:], entry.path)
+                             for files in _scan_tree(directory) for entry in files)
+            paths = [(path, algorithm) for _, path in entries]
+
+            # map cuva redoslijed, pa je rezultat isti kao kod serijskog izracuna
+            if len(paths) >= PARALLEL_HASH_MIN_FILES:
+                try:
+                    results = list(_hash_pool().map(_digest_one, paths, chunksize=16))
+                except BrokenProcessPool:
+                    _discard_hash_pool()
+                    raise
+            else:
+                results = map(_digest_one, paths)
+
+            for digest in results:
+                combined_hash.update(digest)
             
             return combined_hash.hexdigest()
         except Exception as e:
             if self.logger:
                 self.logger.logger.error(f"Greska pri izracunu direktorij hasha: {e}")
             raise
+
+
+@functools.lru_cache(maxsize=8)
+def get_integrity_checker(algorithm: str = 'sha256', logger=None) -> IntegrityChecker:
+    """Zajednicki checker po (algoritam, logger)"""
+    return IntegrityChecker(algorithm, logger)
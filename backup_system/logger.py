@@ -4,22 +4,58 @@ Problem: PermissionError pri kreiranju log datoteka
 Rješenje: Osiguraj da direktorij postoji prije nego što kreiramo FileHandler
 """
 
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
+import threading
 from datetime import datetime
 
+# Jedan formatter za sve handlere i instance - format se parsira jednom, pri importu
+_FORMATTER = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+
+class _BufferedFileHandler(logging.FileHandler):
+    """FileHandler s 64 KB bufferom - na disk se pise u blokovima, ne po recordu"""
+
+    BUFFER_SIZE = 64 * 1024
+
+    def _open(self):
+        return open(self.baseFilename, self.mode, buffering=self.BUFFER_SIZE,
+                    encoding=self.encoding, errors=self.errors)
+
+    def emit(self, record):
+        # Bez flush-a po recordu (to radi StreamHandler) - greske ipak odmah idu na disk
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record) + self.terminator)
+            if record.levelno >= logging.ERROR:
+                self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+
 class BackupLogger:
     """Logger za backup operacije"""
     
+    # Koliko najvise buffer log datoteke ceka na disk
+    FLUSH_INTERVAL = 0.5
+    
     def __init__(self, log_dir: str = './logs'):
         """Inicijalizacija loggera - ISPRAVLJENO"""
         self.log_dir = log_dir
         
         # ISPRAVKA 1: Kreiraj direktorij ako ne postoji
+        # Bez prethodne exists provjere - FileExistsError znaci da direktorij vec postoji
         try:
-            if not os.path.exists(self.log_dir):
-                os.makedirs(self.log_dir, exist_ok=True)
-                print(f"✓ Created log directory: {self.log_dir}")
+            os.makedirs(self.log_dir)
+            print(f"✓ Created log directory: {self.log_dir}")
+        except FileExistsError:
+            pass
         except Exception as e:
             print(f"⚠ Warning: Could not create log directory: {e}")
             # Ako ne možemo kreirati, koristimo trenutni direktorij
@@ -34,11 +70,15 @@ class BackupLogger:
         # Setup logger
         self.logger = logging.getLogger('BackupSystem')
         self.logger.setLevel(logging.DEBUG)
+        self._listener = None
+        self._flush_stop = threading.Event()
+        self._handlers = []  # samo handleri ove instance - 'BackupSystem' logger je dijeljen
+        self._closed = False
         
         # ISPRAVKA 2: Kreiraj handlers nakon što znamo da direktorij postoji
         try:
             # File handler
-            fh = logging.FileHandler(self.backup_log, encoding='utf-8')
+            fh = _BufferedFileHandler(self.backup_log, encoding='utf-8')
             fh.setLevel(logging.DEBUG)
             
             # Console handler
@@ -46,15 +86,18 @@ class BackupLogger:
             ch.setLevel(logging.INFO)
             
             # Formatter
-            formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-            fh.setFormatter(formatter)
-            ch.setFormatter(formatter)
+            fh.setFormatter(_FORMATTER)
+            ch.setFormatter(_FORMATTER)
             
-            # Dodaj handlere
-            self.logger.addHandler(fh)
-            self.logger.addHandler(ch)
+            # Handlere vodi listener thread - log poziv je samo put u red, bez cekanja na disk
+            log_queue = queue.SimpleQueue()
+            self._listener = logging.handlers.QueueListener(log_queue, fh, ch, respect_handler_level=True)
+            self._listener.start()
+            threading.Thread(target=self._flush_loop, args=(fh,), daemon=True).start()
+            atexit.register(self.close)
+            self._add_handler(logging.handlers.QueueHandler(log_queue))
             
-            self.logger.info(f"Logger initialized: {self.backup_log}")
+            self.logger.info("Logger initialized: %s", self.backup_log)
         
         except Exception as e:
             print(f"⚠ Warning: Could not initialize file logging: {e}")
@@ -63,76 +106,128 @@ class BackupLogger:
             # Kreiraj samo console handler ako file logging ne radi
             ch = logging.StreamHandler()
             ch.setLevel(logging.INFO)
-            formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-            ch.setFormatter(formatter)
-            self.logger.addHandler(ch)
+            ch.setFormatter(_FORMATTER)
+            self._add_handler(ch)
     
     def log_backup_start(self, backup_id: str, backup_type: str, source_path: str):
         """Logiraj početak backupa"""
-        msg = f"Backup started | ID: {backup_id} | Type: {backup_type} | Source: {source_path}"
-        self.logger.info(msg)
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        self.logger.info("Backup started | ID: %s | Type: %s | Source: %s", backup_id, backup_type, source_path)
     
     def log_backup_complete(self, backup_id: str, file_count: int, size_bytes: int, duration_seconds: float):
         """Logiraj završetak backupa"""
-        size_mb = size_bytes / (1024 * 1024)
-        msg = f"Backup completed | ID: {backup_id} | Files: {file_count} | Size: {size_mb:.2f} MB | Duration: {duration_seconds:.2f}s"
-        self.logger.info(msg)
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        self.logger.info("Backup completed | ID: %s | Files: %d | Size: %.2f MB | Duration: %.2fs",
+                         backup_id, file_count, size_bytes / (1024 * 1024), duration_seconds)
     
     def log_backup_error(self, backup_id: str, error_message: str):
         """Logiraj grešku pri backupu"""
-        msg = f"Backup error | ID: {backup_id} | Error: {error_message}"
-        self.logger.error(msg)
+        if not self.logger.isEnabledFor(logging.ERROR):
+            return
+        self.logger.error("Backup error | ID: %s | Error: %s", backup_id, error_message)
     
     def log_recovery_start(self, recovery_id: str, backup_id: str, destination: str):
         """Logiraj početak oporavka"""
-        msg = f"Recovery started | Recovery ID: {recovery_id} | Backup ID: {backup_id} | Destination: {destination}"
-        self.logger.info(msg)
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        self.logger.info("Recovery started | Recovery ID: %s | Backup ID: %s | Destination: %s",
+                         recovery_id, backup_id, destination)
     
     def log_recovery_complete(self, recovery_id: str, file_count: int, duration_seconds: float, rto_seconds: float):
         """Logiraj završetak oporavka"""
-        msg = f"Recovery completed | ID: {recovery_id} | Files: {file_count} | Duration: {duration_seconds:.2f}s | RTO: {rto_seconds:.2f}s"
-        self.logger.info(msg)
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        self.logger.info("Recovery completed | ID: %s | Files: %d | Duration: %.2fs | RTO: %.2fs",
+                         recovery_id, file_count, duration_seconds, rto_seconds)
     
     def log_recovery_error(self, recovery_id: str, error_message: str):
         """Logiraj grešku pri oporavku"""
-        msg = f"Recovery error | ID: {recovery_id} | Error: {error_message}"
-        self.logger.error(msg)
+        if not self.logger.isEnabledFor(logging.ERROR):
+            return
+        self.logger.error("Recovery error | ID: %s | Error: %s", recovery_id, error_message)
     
     def log_integrity_check(self, backup_id: str, status: str, details: str):
         """Logiraj provjeru integriteta"""
-        msg = f"Integrity check | Backup ID: {backup_id} | Status: {status} | Details: {details}"
-        self.logger.info(msg)
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        self.logger.info("Integrity check | Backup ID: %s | Status: %s | Details: %s", backup_id, status, details)
     
     def log_verification_error(self, backup_id: str, file_path: str, error: str):
         """Logiraj grešku pri verifikaciji"""
-        msg = f"Verification error | Backup ID: {backup_id} | File: {file_path} | Error: {error}"
-        self.logger.warning(msg)
+        if not self.logger.isEnabledFor(logging.WARNING):
+            return
+        self.logger.warning("Verification error | Backup ID: %s | File: %s | Error: %s", backup_id, file_path, error)
     
     def log_scheduler_start(self, schedule_id: str, schedule_type: str):
         """Logiraj početak schedulera"""
-        msg = f"Scheduler started | ID: {schedule_id} | Type: {schedule_type}"
-        self.logger.info(msg)
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        self.logger.info("Scheduler started | ID: %s | Type: %s", schedule_id, schedule_type)
     
     def log_scheduler_task(self, schedule_id: str, task_type: str, status: str):
         """Logiraj scheduler task"""
-        msg = f"Scheduler task | ID: {schedule_id} | Task: {task_type} | Status: {status}"
-        self.logger.info(msg)
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        self.logger.info("Scheduler task | ID: %s | Task: %s | Status: %s", schedule_id, task_type, status)
     
     def log_version_update(self, version_id: str, changes: str):
         """Logiraj verziju backupa"""
-        msg = f"Version update | ID: {version_id} | Changes: {changes}"
-        self.logger.info(msg)
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        self.logger.info("Version update | ID: %s | Changes: %s", version_id, changes)
+    
+    def _flush_loop(self, handler: logging.Handler):
+        """Periodicki flush buffera log datoteke dok logger nije zatvoren"""
+        while not self._flush_stop.wait(self.FLUSH_INTERVAL):
+            handler.flush()
+    
+    def _add_handler(self, handler: logging.Handler):
+        self._handlers.append(handler)
+        self.logger.addHandler(handler)
     
     def close(self):
-        """Zatvori logger"""
-        for handler in self.logger.handlers[:]:
-            handler.close()
+        """Zatvori logger - drugi poziv (npr. iz atexit nakon rucnog close) ne radi nista"""
+        if self._closed:
+            return
+        self._closed = True
+        self._flush_stop.set()
+        
+        for handler in self._handlers:
             self.logger.removeHandler(handler)
+        # Listener prvo isprazni red u handlere, tek onda se oni zatvaraju
+        handlers = list(self._handlers)
+        if self._listener is not None:
+            self._listener.stop()
+            handlers.extend(self._listener.handlers)
+            self._listener = None
+        # Jedan prolaz flush pa close - buffer datoteke ide na disk prije zatvaranja svih handlera
+        for handler in handlers:
+            handler.flush()
+        for handler in handlers:
+            handler.close()
+        self._handlers.clear()
     def log_version_cleanup(self, deleted_backups: int, freed_bytes: int):
         """Logiraj čišćenje svih starih backup-a"""
-        size_mb = freed_bytes / (1024*1024)
-        msg = f"Version cleanup | Deleted backups: {deleted_backups} | Freed space: {size_mb:.2f} MB"
-        self.logger.info(msg)
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        self.logger.info("Version cleanup | Deleted backups: %d | Freed space: %.2f MB",
+                         deleted_backups, freed_bytes / (1024 * 1024))
+
+
+class NullBackupLogger(BackupLogger):
+    """Zamjena kad logger nije zadan - pozivi se odbacuju vec na isEnabledFor, bez if self.logger provjera"""
+    
+    def __init__(self):
+        self.logger = logging.getLogger('BackupSystem.null')
+        self.logger.setLevel(logging.CRITICAL + 1)
+        self.logger.propagate = False
+        self._listener = None
+        self._flush_stop = threading.Event()
+        self._handlers = []  # samo handleri ove instance - 'BackupSystem' logger je dijeljen
+        self._closed = False
+
 
 # Test script
 if __name__ == '__main__':
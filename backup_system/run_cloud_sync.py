@@ -2,7 +2,9 @@
 Jednostavni skripti za cloud sinhronizaciju
 """
 
+import io
 import os
+import sys
 from cloud_sync import CloudSync
 from logger import BackupLogger
 
@@ -27,21 +29,24 @@ def main():
 
     elif choice == '2':
         backups = cloud_sync.get_s3_backup_list()
-        print(f"\n{'='*80}")
-        print(f"BACKUP-I NA S3-u ({len(backups)} datoteka)")
-        print(f"{'='*80}")
+        # Ispis se skuplja u buffer i piše jednom - bez write/flush po svakom retku
+        out = io.StringIO()
+        out.write(f"\n{'='*80}\n")
+        out.write(f"BACKUP-I NA S3-u ({len(backups)} datoteka)\n")
+        out.write(f"{'='*80}\n")
 
         total_size = 0
         for backup in backups:
             size_mb = backup['size_bytes'] / (1024 * 1024)
             total_size += backup['size_bytes']
-            print(f" {backup['key']}")
-            print(f"   Veličina: {size_mb:.2f} MB")
-            print(f"   Storage: {backup['storage_class']}")
-            print(f"   Vrijeme: {backup['last_modified']}\n")
+            out.write(f" {backup['key']}\n"
+                      f"   Veličina: {size_mb:.2f} MB\n"
+                      f"   Storage: {backup['storage_class']}\n"
+                      f"   Vrijeme: {backup['last_modified']}\n\n")
 
-        print(f"{'='*80}")
-        print(f"Ukupna veličina: {total_size / (1024*1024*1024):.2f} GB")
+        out.write(f"{'='*80}\n")
+        out.write(f"Ukupna veličina: {total_size / (1024*1024*1024):.2f} GB\n")
+        sys.stdout.write(out.getvalue())
 
     elif choice == '3':
         days = input("Koliko dana? (default 90): ").strip()
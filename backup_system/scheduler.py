@@ -2,133 +2,356 @@
 Planiranje i automatizacija backup operacija
 """
 
-import schedule
-import time
+import heapq
+import itertools
+import json
+import os
+import pickle
+import secrets
+import socket
+import subprocess
+import sys
 import threading
-from datetime import datetime
-from typing import Dict, List
+import time
+from datetime import datetime, timedelta
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from typing import Callable, Dict, List
+
+from backup_engine import BackupEngine
+from integrity_checker import get_integrity_checker
+from logger import BackupLogger, NullBackupLogger
+
+# Najdulje spavanje scheduler petlje - ogranicava kasnjenje ako se sistemski sat pomakne
+SCHEDULER_MAX_SLEEP = 60
+
+# Lokalni port scheduler servisa ako config.json ne zadaje drugi
+SERVICE_PORT = 47211
+
+# Koliko GUI ceka da se tek pokrenuti servis javi
+SERVICE_START_TIMEOUT = 10
+
+# Koliko se ceka da servis na portu posalje auth challenge - inace port drzi drugi program
+SERVICE_PROBE_TIMEOUT = 1
+
+# Tip backupa -> metoda BackupEnginea koju zakazani job poziva
+_BACKUP_METHODS = {
+    'full': 'full_backup',
+    'incremental': 'incremental_backup',
+    'differential': 'differential_backup'
+}
+
+
+
+def _next_daily_run(time_str: str, now: float) -> float:
+    """Epoch sljedeceg dnevnog pokretanja u HH:MM (lokalno vrijeme), strogo nakon now"""
+    at = datetime.strptime(time_str, '%H:%M')  # ValueError za neispravno vrijeme
+    current = datetime.fromtimestamp(now)
+    run = current.replace(hour=at.hour, minute=at.minute, second=0, microsecond=0)
+    if run <= current:
+        run += timedelta(days=1)
+    return run.timestamp()
+
+
+class _HeapScheduler:
+    """Dnevni jobovi u min-heapu po sljedecem pokretanju - O(log N) po pokretanju, bez skeniranja svih jobova.
+    Zapis je [epoch, redni broj, funkcija, HH:MM]; otkazani job ima funkciju None i preskace se pri vadenju."""
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def add_daily(self, time_str: str, fn: Callable) -> list:
+        entry = [_next_daily_run(time_str, time.time()), next(self._counter), fn, time_str]
+        with self._lock:
+            heapq.heappush(self._heap, entry)
+        return entry
+
+    @staticmethod
+    def cancel(entry: list):
+        entry[2] = None
+
+    def pop_due(self, now: float) -> List[Callable]:
+        """Jobovi kojima je rok prosao; svaki se odmah vraca u heap sa sljedecim danom"""
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                entry = heapq.heappop(self._heap)
+                if entry[2] is None:
+                    continue
+                due.append(entry[2])
+                entry[0] = _next_daily_run(entry[3], now)
+                heapq.heappush(self._heap, entry)
+        return due
+
+    def next_run(self):
+        """Epoch najblizeg aktivnog joba ili None"""
+        with self._lock:
+            while self._heap and self._heap[0][2] is None:
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
 
 
 class BackupScheduler:
     """Upravlja planiranjem i izvršavanjem backup operacija"""
     
-    def __init__(self, backup_engine=None, logger=None):
+    def __init__(self, backup_engine=None, logger=None, log_every: int = 1):
+        """log_every: uspjesna pokretanja jobova se logiraju svako N-to pokretanje, greske uvijek"""
         self.backup_engine = backup_engine
-        self.logger = logger
+        self.logger = logger or NullBackupLogger()
+        self.log_every = max(1, log_every)
+        self._run_count = {}
         self.schedule_jobs = []
         self.is_running = False
         self.scheduler_thread = None
+        self._jobs = _HeapScheduler()
+        # Budi petlju prije isteka spavanja - novi job ili stop
+        self._wakeup = threading.Event()
     
     # ---------------- Schedule backup ----------------
     def schedule_full_backup(self, source_dir: str, time_str: str = "02:00"):
-        def job():
-            if self.logger:
-                self.logger.logger.info(f"Pokretanje scheduled full backup: {source_dir}")
-            if self.backup_engine:
-                success, metadata = self.backup_engine.full_backup(source_dir)
-                if success:
-                    if self.logger:
-                        self.logger.logger.info(f"Scheduled full backup uspjesna: {metadata['id']}")
-                else:
-                    if self.logger:
-                        self.logger.logger.error(f"Scheduled full backup neuspjesna: {metadata.get('error')}")
-        scheduled_job = schedule.every().day.at(time_str).do(job)
-        self.schedule_jobs.append({'type': 'full', 'source': source_dir, 'time': time_str, 'job': scheduled_job})
-        if self.logger:
-            self.logger.logger.info(f"Planirano daily full backup: {source_dir} u {time_str}")
+        self._schedule_daily('full', source_dir, time_str)
     
     def schedule_incremental_backup(self, source_dir: str, time_str: str = "12:00"):
-        def job():
-            if self.logger:
-                self.logger.logger.info(f"Pokretanje scheduled incremental backup: {source_dir}")
-            if self.backup_engine:
-                success, metadata = self.backup_engine.incremental_backup(source_dir)
-                if success:
-                    if self.logger:
-                        self.logger.logger.info(f"Scheduled incremental backup uspjesna: {metadata['id']}")
-                else:
-                    if self.logger:
-                        self.logger.logger.error(f"Scheduled incremental backup neuspjesna: {metadata.get('error')}")
-        scheduled_job = schedule.every().day.at(time_str).do(job)
-        self.schedule_jobs.append({'type': 'incremental', 'source': source_dir, 'time': time_str, 'job': scheduled_job})
-        if self.logger:
-            self.logger.logger.info(f"Planirano daily incremental backup: {source_dir} u {time_str}")
+        self._schedule_daily('incremental', source_dir, time_str)
     
     def schedule_differential_backup(self, source_dir: str, time_str: str = "18:00"):
+        self._schedule_daily('differential', source_dir, time_str)
+
+    def _schedule_daily(self, backup_type: str, source_dir: str, time_str: str):
+        """Zajednicka izvedba schedule_*_backup - jedan job za sva tri tipa"""
+        # Metoda enginea se dohvaca jednom, pri zakazivanju, ne pri svakom pokretanju
+        run_backup = getattr(self.backup_engine, _BACKUP_METHODS[backup_type]) if self.backup_engine else None
+
         def job():
-            if self.logger:
-                self.logger.logger.info(f"Pokretanje scheduled differential backup: {source_dir}")
-            if self.backup_engine:
-                success, metadata = self.backup_engine.differential_backup(source_dir)
+            log_run = self._count_run(backup_type, source_dir)
+            if log_run:
+                self.logger.logger.info(f"Pokretanje scheduled {backup_type} backup: {source_dir}")
+            if run_backup:
+                success, metadata = run_backup(source_dir)
                 if success:
-                    if self.logger:
-                        self.logger.logger.info(f"Scheduled differential backup uspjesna: {metadata['id']}")
+                    if log_run:
+                        self.logger.logger.info(f"Scheduled {backup_type} backup uspjesna: {metadata['id']}")
                 else:
-                    if self.logger:
-                        self.logger.logger.error(f"Scheduled differential backup neuspjesna: {metadata.get('error')}")
-        scheduled_job = schedule.every().day.at(time_str).do(job)
-        self.schedule_jobs.append({'type': 'differential', 'source': source_dir, 'time': time_str, 'job': scheduled_job})
-        if self.logger:
-            self.logger.logger.info(f"Planirano daily differential backup: {source_dir} u {time_str}")
+                    self.logger.logger.error(f"Scheduled {backup_type} backup neuspjesna: {metadata.get('error')}")
+        scheduled_job = self._jobs.add_daily(time_str, job)
+        self.schedule_jobs.append({'type': backup_type, 'source': source_dir, 'time': time_str, 'job': scheduled_job})
+        self._wakeup.set()
+        self.logger.logger.info(f"Planirano daily {backup_type} backup: {source_dir} u {time_str}")
+
+    def _count_run(self, backup_type: str, source_dir: str) -> bool:
+        """Broji pokretanja joba - True ako ovo pokretanje ide u log (prvo pa svako log_every-to)"""
+        key = (backup_type, source_dir)
+        count = self._run_count.get(key, 0)
+        self._run_count[key] = count + 1
+        return count % self.log_every == 0
 
     # ---------------- Scheduler kontrola ----------------
     def start_scheduler(self):
         if self.is_running:
-            if self.logger:
-                self.logger.logger.warning("Scheduler je već pokrenut")
+            self.logger.logger.warning("Scheduler je već pokrenut")
             return
         self.is_running = True
         self.scheduler_thread = threading.Thread(target=self._run_scheduler, daemon=True)
         self.scheduler_thread.start()
-        if self.logger:
-            self.logger.logger.info("Scheduler pokrenut")
+        self.logger.logger.info("Scheduler pokrenut")
     
     def _run_scheduler(self):
         while self.is_running:
-            try:
-                schedule.run_pending()
-                time.sleep(1)
-            except Exception as e:
-                if self.logger:
+            for job in self._jobs.pop_due(time.time()):
+                try:
+                    job()
+                except Exception as e:
                     self.logger.logger.error(f"Greska u scheduler petlji: {e}")
+            # Spava tocno do roka sljedeceg joba umjesto budjenja svake sekunde
+            next_run = self._jobs.next_run()
+            timeout = SCHEDULER_MAX_SLEEP if next_run is None else min(max(next_run - time.time(), 0), SCHEDULER_MAX_SLEEP)
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
     
     def stop_scheduler(self):
         self.is_running = False
+        self._wakeup.set()
         if self.scheduler_thread:
             self.scheduler_thread.join(timeout=5)
-        if self.logger:
-            self.logger.logger.info("Scheduler zaustavljen")
+        self.logger.logger.info("Scheduler zaustavljen")
 
-    def cancel_all_backups(self):
-        """Otkazivanje svih zakazanih backup-a"""
+    def cancel_all_backups(self) -> int:
+        """Otkazivanje svih zakazanih backup-a - vraca broj otkazanih jobova"""
+        count = len(self.schedule_jobs)
         for job in self.schedule_jobs:
-            schedule.cancel_job(job['job'])
+            self._jobs.cancel(job['job'])
         self.schedule_jobs.clear()
-        if self.logger:
-            self.logger.logger.info("Otkazani svi zakazani backup-i")
+        self.logger.logger.info("Otkazani svi zakazani backup-i")
+        return count
 
     # ---------------- Informacije ----------------
     def get_scheduled_jobs(self) -> List[Dict]:
         return self.schedule_jobs
     
     def get_scheduler_status(self) -> Dict:
+        next_run = self._jobs.next_run()
         return {
             'running': self.is_running,
             'scheduled_jobs': len(self.schedule_jobs),
             'jobs': [{'type': j['type'], 'source': j.get('source'), 'time': j['time']} for j in self.schedule_jobs],
-            'next_run': schedule.next_run().isoformat() if schedule.get_jobs() else None
+            'next_run': datetime.fromtimestamp(next_run).isoformat() if next_run is not None else None
         }
 
     # ---------------- Universal scheduler ----------------
     def schedule_backup(self, source_dir: str, hour: int = 2, minute: int = 0, backup_type: str = "full"):
         """Planiranje backup-a prema tipu"""
         time_str = f"{hour:02d}:{minute:02d}"
-        if backup_type == "full":
-            self.schedule_full_backup(source_dir, time_str)
-        elif backup_type == "incremental":
-            self.schedule_incremental_backup(source_dir, time_str)
-        elif backup_type == "differential":
-            self.schedule_differential_backup(source_dir, time_str)
+        if backup_type in _BACKUP_METHODS:
+            self._schedule_daily(backup_type, source_dir, time_str)
         else:
-            if self.logger:
-                self.logger.logger.error(f"Neispravan tip backup-a: {backup_type}")
+            self.logger.logger.error(f"Neispravan tip backup-a: {backup_type}")
+
+
+def _service_address(config: Dict):
+    """Servis slusa samo na localhostu; port iz config.json (scheduler.port)"""
+    return '127.0.0.1', config.get('scheduler', {}).get('port', SERVICE_PORT)
+
+
+def _service_authkey(config: Dict) -> bytes:
+    """Tajni kljuc u backup_root-u. Servis unpickla naredbe sa socketa, sto je sigurno samo
+    zato sto se klijent prvo mora autentificirati ovim kljucem - datoteka je zato 0600
+    (samo vlasnik je smije citati) i ne smije postati citljiva drugim korisnicima."""
+    backup_root = config['system_config']['backup_root']
+    os.makedirs(backup_root, exist_ok=True)
+    key_path = os.path.join(backup_root, '.scheduler_key')
+    try:
+        fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # umask ili kopiranje mogu prosiriti prava postojece datoteke
+        if os.name == 'posix' and os.stat(key_path).st_mode & 0o077:
+            os.chmod(key_path, 0o600)
+        with open(key_path, 'rb') as f:
+            return f.read()
+    key = secrets.token_bytes(32)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+    return key
+
+
+def _run_service(config: Dict):
+    """Servisni proces: vlastiti engine i scheduler, naredbe stizu preko lokalnog socketa.
+    Neovisan je o GUI-ju - zakazani backupi rade i kad je GUI zatvoren."""
+    logger = BackupLogger(config['logging']['log_file'])
+    integrity_config = config.get('integrity_check', {})
+    integrity_checker = get_integrity_checker(
+        integrity_config.get('algorithm', 'sha256'),
+        logger
+    )
+    backup_engine = BackupEngine(config['system_config']['backup_root'], logger, integrity_checker)
+    scheduler = BackupScheduler(backup_engine=backup_engine, logger=logger)
+
+    with Listener(_service_address(config), authkey=_service_authkey(config)) as listener:
+        scheduler.start_scheduler()
+        try:
+            while True:
+                # jedna naredba po konekciji - GUI se spaja samo kad nesto treba
+                try:
+                    conn = listener.accept()
+                except (AuthenticationError, EOFError, OSError):
+                    continue  # pogresan kljuc ili provjera dostupnosti (_is_running)
+                with conn:
+                    try:
+                        name, args, kwargs = pickle.loads(conn.recv_bytes())
+                    except (EOFError, OSError):
+                        continue
+                    if name == 'stop':
+                        conn.send_bytes(pickle.dumps((True, None)))
+                        break
+                    try:
+                        reply = (True, getattr(scheduler, name)(*args, **kwargs))
+                    except Exception as e:
+                        reply = (False, str(e))
+                    try:
+                        conn.send_bytes(pickle.dumps(reply))
+                    except OSError:
+                        pass
+        finally:
+            scheduler.stop_scheduler()
+
+
+class SchedulerService:
+    """BackupScheduler u zasebnom procesu - zakazani backupi ne dijele CPU i GIL s GUI-jem
+    i nastavljaju raditi nakon zatvaranja GUI-ja; ponovno pokrenut GUI spaja se na isti servis"""
+
+    def __init__(self, config: Dict):
+        self.config = config
+        self.address = _service_address(config)
+        self.authkey = None
+
+    def start_scheduler(self):
+        """Spaja se na servis koji vec radi ili pokrece novi"""
+        self.authkey = _service_authkey(self.config)
+        if self._is_running():
+            return
+        # zaseban proces, ne dijete GUI-ja - nije daemonic pa smije koristiti ProcessPoolExecutor
+        options = {}
+        if sys.platform == 'win32':
+            options['creationflags'] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            options['start_new_session'] = True
+        process = subprocess.Popen([sys.executable, os.path.abspath(__file__)],
+                                   stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.DEVNULL, **options)
+        # config ide preko stdina - servis koristi iste postavke kao GUI
+        process.stdin.write(json.dumps(self.config).encode('utf-8'))
+        process.stdin.close()
+
+        deadline = time.time() + SERVICE_START_TIMEOUT
+        while not self._is_running():
+            if process.poll() is not None or time.time() > deadline:
+                raise RuntimeError("Scheduler servis se nije pokrenuo")
+            time.sleep(0.1)
+
+    def _is_running(self) -> bool:
+        """Client nema timeout - port se prvo provjeri s timeoutom da GUI ne visi
+        ako ga drzi program koji ne odgovara na auth handshake"""
+        try:
+            with socket.create_connection(self.address, timeout=SERVICE_PROBE_TIMEOUT) as sock:
+                # Listener s authkeyem odmah salje challenge
+                if not sock.recv(1):
+                    return False
+        except socket.timeout:
+            raise RuntimeError(f"Port {self.address[1]} koristi drugi program (scheduler.port u config.json)")
+        except OSError:
+            return False
+        try:
+            self._call('get_scheduler_status')
+            return True
+        except (ConnectionError, EOFError, AuthenticationError):
+            # nema servisa ili se upravo gasi
+            return False
+
+    def _call(self, name: str, *args, **kwargs):
+        with Client(self.address, authkey=self.authkey) as conn:
+            conn.send_bytes(pickle.dumps((name, args, kwargs)))
+            ok, result = pickle.loads(conn.recv_bytes())
+        if not ok:
+            raise RuntimeError(result)
+        return result
+
+    def schedule_backup(self, source_dir: str, hour: int = 2, minute: int = 0, backup_type: str = "full"):
+        self._call('schedule_backup', source_dir, hour=hour, minute=minute, backup_type=backup_type)
+
+    def cancel_all_backups(self) -> int:
+        return self._call('cancel_all_backups')
+
+    def get_scheduler_status(self) -> Dict:
+        return self._call('get_scheduler_status')
+
+    def stop_scheduler(self):
+        """Gasi servis - zakazani backupi se vise ne izvode"""
+        try:
+            self._call('stop')
+        except (ConnectionError, EOFError):
+            pass
+
+
+if __name__ == '__main__':
+    _run_service(json.loads(sys.stdin.read()))
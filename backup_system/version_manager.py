@@ -2,24 +2,68 @@
 Upravljanje verzijama i retention politikom
 """
 
+import functools
 import os
 import shutil
 import json
-from datetime import datetime, timedelta
-from typing import Dict, List
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from logger import NullBackupLogger
+
+BACKUP_TYPES = ('full', 'incremental', 'differential')
+
+# Racunanje velicine je stat po datoteci (I/O) - threadovi drze vise zahtjeva prema disku u tijeku
+SIZE_WORKERS = 8
+
+# Istekli backupi se preimenuju u .trash i brisu ovdje - retention ne ceka na rmtree
+_trash_executor = ThreadPoolExecutor(max_workers=1)
+
+
+def _directory_size(directory: str) -> int:
+    """Veličina direktorija - scandir, jedan stat po datoteci"""
+    total_size = 0
+    stack = [directory]
+    
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            continue  # kao os.walk - nečitljiv poddirektorij se preskače
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                else:
+                    total_size += entry.stat(follow_symlinks=False).st_size
+    
+    return total_size
+
+
+@functools.lru_cache(maxsize=1024)
+def _cached_directory_size(directory: str, stamp: Tuple) -> int:
+    """stamp je samo dio ključa cachea - vidi VersionManager._completion_stamp"""
+    return _directory_size(directory)
+
 
 class VersionManager:
     """Upravlja verzijama backup-a i primjenom retention politike"""
     
     def __init__(self, backup_root: str, retention_policy: Dict = None, logger=None):
         self.backup_root = backup_root
-        self.logger = logger
+        self.logger = logger or NullBackupLogger()
         self.retention_policy = retention_policy or {
             'full_backup_days': 7,
             'incremental_backup_days': 1,
             'differential_backup_days': 3,
             'monthly_retention_months': 12
         }
+        self.trash_dir = os.path.join(backup_root, '.trash')
+        self.files_dir = os.path.join(backup_root, '.metadata', 'files')
+        self._empty_trash()
     
     def apply_retention_policy(self) -> Dict:
         """Primijeni retention politiku i obriši stare backupe"""
@@ -30,46 +74,69 @@ class VersionManager:
             'total_space_freed_bytes': 0
         }
         
-        cutoff_dates = {
-            'full': datetime.now() - timedelta(days=self.retention_policy['full_backup_days']),
-            'incremental': datetime.now() - timedelta(days=self.retention_policy['incremental_backup_days']),
-            'differential': datetime.now() - timedelta(days=self.retention_policy['differential_backup_days'])
+        # Granice kao epoch sekunde - ctime se usporeduje izravno, bez datetime objekta po backupu
+        now = time.time()
+        cutoff_times = {
+            backup_type: now - self.retention_policy[f'{backup_type}_backup_days'] * 86400
+            for backup_type in BACKUP_TYPES
         }
         
-        for backup_type in ['full', 'incremental', 'differential']:
-            type_dir = os.path.join(self.backup_root, backup_type)
-            
-            if not os.path.exists(type_dir):
-                continue
-            
-            for backup_id in os.listdir(type_dir):
-                backup_path = os.path.join(type_dir, backup_id)
+        expired = [(backup_type, backup_id, backup_path)
+                   for backup_type, backup_id, backup_path, ctime in self._scan_backups()
+                   if ctime < cutoff_times[backup_type]]
+        sizes = self._get_directory_sizes([backup_path for _, _, backup_path in expired])
+        
+        for (backup_type, backup_id, backup_path), space_freed in zip(expired, sizes):
+            try:
+                self._move_to_trash(backup_id, backup_path)
+                
+                results[f'{backup_type}_backups_deleted'] += 1
+                results['total_space_freed_bytes'] += space_freed
                 
-                if os.path.isdir(backup_path):
-                    backup_time = datetime.fromtimestamp(os.path.getctime(backup_path))
-                    
-                    if backup_time < cutoff_dates[backup_type]:
-                        try:
-                            space_freed = self._get_directory_size(backup_path)
-                            shutil.rmtree(backup_path)
-                            
-                            results[f'{backup_type}_backups_deleted'] += 1
-                            results['total_space_freed_bytes'] += space_freed
-                            
-                            if self.logger:
-                                self.logger.logger.info(f"Obrisan stari {backup_type} backup: {backup_id}")
-                        except Exception as e:
-                            if self.logger:
-                                self.logger.logger.error(f"Greska pri brisanju {backup_id}: {e}")
+                self.logger.logger.info(f"Obrisan stari {backup_type} backup: {backup_id}")
+            except Exception as e:
+                self.logger.logger.error(f"Greska pri brisanju {backup_id}: {e}")
+        if expired:
+            # lru_cache ne briše pojedinačne ključeve - obrisani backupi ne ostaju u cacheu
+            _cached_directory_size.cache_clear()
         
-        if self.logger:
-            self.logger.log_version_cleanup(
-                results['full_backups_deleted'] + results['incremental_backups_deleted'] + results['differential_backups_deleted'],
-                results['total_space_freed_bytes']
-            )
+        self.logger.log_version_cleanup(
+            results['full_backups_deleted'] + results['incremental_backups_deleted'] + results['differential_backups_deleted'],
+            results['total_space_freed_bytes']
+        )
         
         return results
     
+    def _move_to_trash(self, backup_id: str, backup_path: str):
+        """Rename u .trash (odmah nestaje iz popisa backupa), brisanje u pozadini"""
+        trashed = os.path.join(self.trash_dir, f'{backup_id}.{uuid.uuid4().hex}')
+        try:
+            os.makedirs(self.trash_dir, exist_ok=True)
+            os.rename(backup_path, trashed)
+        except OSError:
+            # npr. backup na drugom disku - rename nije moguc, brise se odmah
+            shutil.rmtree(backup_path)
+            return
+        _trash_executor.submit(self._remove_trashed, trashed)
+    
+    def _remove_trashed(self, path: str):
+        try:
+            shutil.rmtree(path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            self.logger.logger.error(f"Greska pri brisanju {path}: {e}")
+    
+    def _empty_trash(self):
+        """Ostaci iz .trash koje prethodni proces nije stigao obrisati"""
+        try:
+            it = os.scandir(self.trash_dir)
+        except OSError:
+            return
+        with it:
+            for entry in it:
+                _trash_executor.submit(self._remove_trashed, entry.path)
+    
     def get_version_statistics(self) -> Dict:
         """Statistika verzija"""
         stats = {
@@ -80,47 +147,70 @@ class VersionManager:
             'newest_backup': None
         }
         
-        for backup_type in ['full', 'incremental', 'differential']:
-            type_dir = os.path.join(self.backup_root, backup_type)
-            
-            if not os.path.exists(type_dir):
-                continue
+        backups = self._scan_backups()
+        stats['total_size_bytes'] = sum(self._get_directory_sizes([backup[2] for backup in backups]))
+        
+        oldest = newest = None
+        for backup_type, backup_id, backup_path, ctime in backups:
+            stats['total_backups'] += 1
+            stats['by_type'][backup_type] += 1
             
-            for backup_id in os.listdir(type_dir):
-                backup_path = os.path.join(type_dir, backup_id)
-                
-                if os.path.isdir(backup_path):
-                    size = self._get_directory_size(backup_path)
-                    
-                    stats['total_backups'] += 1
-                    stats['by_type'][backup_type] += 1
-                    stats['total_size_bytes'] += size
-                    
-                    backup_time = datetime.fromtimestamp(os.path.getctime(backup_path))
-                    
-                    if stats['oldest_backup'] is None or backup_time < stats['oldest_backup']:
-                        stats['oldest_backup'] = backup_time.isoformat()
-                    
-                    if stats['newest_backup'] is None or backup_time > stats['newest_backup']:
-                        stats['newest_backup'] = backup_time.isoformat()
+            # Usporedba po timestampu, u ISO string tek na kraju
+            if oldest is None or ctime < oldest:
+                oldest = ctime
+            if newest is None or ctime > newest:
+                newest = ctime
+        
+        if oldest is not None:
+            stats['oldest_backup'] = datetime.fromtimestamp(oldest).isoformat()
+            stats['newest_backup'] = datetime.fromtimestamp(newest).isoformat()
         
         return stats
     
+    def _scan_backups(self) -> List[Tuple[str, str, str, float]]:
+        """(tip, id, putanja, ctime) svakog backupa - jedan scandir po tipu za retention i statistiku"""
+        backups = []
+        for backup_type in BACKUP_TYPES:
+            try:
+                it = os.scandir(os.path.join(self.backup_root, backup_type))
+            except OSError:
+                continue
+            with it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        backups.append((backup_type, entry.name, entry.path, entry.stat().st_ctime))
+        return backups
+    
+    def _completion_stamp(self, directory: str):
+        """(mtime popisa datoteka, mtime MANIFEST.json) - mijenja se kad se backup dovrši ili ponovno
+        napiše; ctime vršnog direktorija ne vidi promjene u poddirektorijima. None dok backup nije gotov."""
+        try:
+            files_mtime = os.stat(os.path.join(self.files_dir, os.path.basename(directory) + '.json')).st_mtime_ns
+        except OSError:
+            return None
+        try:
+            manifest_mtime = os.stat(os.path.join(directory, 'MANIFEST.json')).st_mtime_ns
+        except OSError:
+            manifest_mtime = None
+        return files_mtime, manifest_mtime
+    
     def _get_directory_size(self, directory: str) -> int:
-        """Izračunaj veličinu direktorija"""
-        total_size = 0
-        
+        """Izračunaj veličinu direktorija - dovršen backup se pamti, backup u izradi se uvijek broji"""
         try:
-            for dirpath, dirnames, filenames in os.walk(directory):
-                for filename in filenames:
-                    filepath = os.path.join(dirpath, filename)
-                    if os.path.exists(filepath):
-                        total_size += os.path.getsize(filepath)
+            stamp = self._completion_stamp(directory)
+            if stamp is None:
+                return _directory_size(directory)
+            return _cached_directory_size(directory, stamp)
         except Exception as e:
-            if self.logger:
-                self.logger.logger.error(f"Greska pri izracunu veličine: {e}")
-        
-        return total_size
+            self.logger.logger.error(f"Greska pri izracunu veličine: {e}")
+            return 0
+    
+    def _get_directory_sizes(self, directories: List[str]) -> List[int]:
+        """Velicine vise direktorija, istim redoslijedom - paralelno kad ih je vise"""
+        if len(directories) < 2:
+            return [self._get_directory_size(directory) for directory in directories]
+        with ThreadPoolExecutor(max_workers=min(SIZE_WORKERS, len(directories))) as executor:
+            return list(executor.map(self._get_directory_size, directories))
     
     def get_backup_chain(self, full_backup_id: str) -> List[Dict]:
         """Pronađi sve backupe koji su dio lanca"""
@@ -137,24 +227,29 @@ class VersionManager:
             })
             
             for backup_type in ['incremental', 'differential']:
-                type_dir = os.path.join(self.backup_root, backup_type)
-                
-                if not os.path.exists(type_dir):
+                try:
+                    it = os.scandir(os.path.join(self.backup_root, backup_type))
+                except OSError:
                     continue
                 
-                for backup_id in sorted(os.listdir(type_dir)):
-                    backup_path = os.path.join(type_dir, backup_id)
-                    backup_time = os.path.getctime(backup_path)
-                    
-                    if backup_time > full_time:
-                        chain.append({
-                            'id': backup_id,
-                            'type': backup_type,
-                            'timestamp': datetime.fromtimestamp(backup_time).isoformat()
-                        })
+                # Sortiraju se samo backupi nastali nakon full backupa, ne cijeli direktorij
+                matches = []
+                with it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            backup_time = entry.stat().st_ctime
+                            if backup_time > full_time:
+                                matches.append((entry.name, backup_time))
+                matches.sort()
+                
+                for backup_id, backup_time in matches:
+                    chain.append({
+                        'id': backup_id,
+                        'type': backup_type,
+                        'timestamp': datetime.fromtimestamp(backup_time).isoformat()
+                    })
         
         except Exception as e:
-            if self.logger:
-                self.logger.logger.error(f"Greska pri pronalaženju backup lanca: {e}")
+            self.logger.logger.error(f"Greska pri pronalaženju backup lanca: {e}")
         
         return chain